@@ -0,0 +1,358 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from check_tables import CheckTables
+from create_table import CreateTable
+from memory_usage import MemoryTracker
+from merge_join import MergeJoin
+from bloom_semi_join import BloomSemiJoin
+from numpy_join import NumpyJoin, np
+from parallel_join import ParallelJoin
+from pipelined_hash_join import HashJoin
+from result_sinks import CountSink
+from semi_join import SemiJoin
+from sqlite_join import SQLiteJoin
+from timestamp_filter import filter_tables
+from window_hash_join import WindowHashJoin
+
+
+def hash_join_fttj(run):
+    filtered_table1, filtered_table2 = filter_tables(run.table1, run.table2, run.timestamp_diff)
+    join = HashJoin(list(filtered_table1), list(filtered_table2), run.table1_name, run.table2_name,
+                    run.timestamp_diff, False, sink=run.sink())
+    join.perform_pipelined_hash_join()
+    return join
+
+
+def hash_join_lazy(run):
+    join = HashJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, True,
+                    sink=run.sink())
+    join.perform_pipelined_hash_join()
+    return join
+
+
+def hash_join_compact(run):
+    # Streamed like hash_join_streamed, but the rows of the matches are fetched back by id instead of being kept
+    stream1, _, stream2, _ = run.check_tables.stream_tables(run.batch_size)
+    join = HashJoin(stream1, stream2, run.table1_name, run.table2_name, run.timestamp_diff, True, sink=run.sink(),
+                    compact=True, fetch=run.check_tables.row_fetchers())
+    join.perform_pipelined_hash_join()
+    return join
+
+
+def hash_join_streamed(run):
+    stream1, _, stream2, _ = run.check_tables.stream_tables(run.batch_size)
+    join = HashJoin(stream1, stream2, run.table1_name, run.table2_name, run.timestamp_diff, True, sink=run.sink())
+    join.perform_pipelined_hash_join()
+    return join
+
+
+def hash_join_window(run):
+    join = WindowHashJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, 24,
+                          sink=run.sink())
+    join.perform_pipelined_hash_join()
+    return join
+
+
+def merge_join_lazy(run):
+    stream1, _, stream2, _ = run.check_tables.stream_tables(run.batch_size, ordered=True)
+    join = MergeJoin(stream1, stream2, run.table1_name, run.table2_name, run.timestamp_diff, True, sink=run.sink())
+    join.perform_merge_join()
+    return join
+
+
+def semi_join_fttj(run):
+    filtered_table1, filtered_table2 = filter_tables(run.table1, run.table2, run.timestamp_diff)
+    join = SemiJoin(list(filtered_table1), list(filtered_table2), run.table1_name, run.table2_name,
+                    run.timestamp_diff, False, False, sink=run.sink())
+    join.perform_semi_join()
+    return join
+
+
+def semi_join_eager(run):
+    join = SemiJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, False, True,
+                    sink=run.sink())
+    join.perform_semi_join()
+    return join
+
+
+def semi_join_lazy(run):
+    join = SemiJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, True, False,
+                    sink=run.sink())
+    join.perform_semi_join()
+    return join
+
+
+def semi_join_bloom(run):
+    join = BloomSemiJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, 0.01, True,
+                         sink=run.sink())
+    join.perform_semi_join()
+    return join
+
+
+def semi_join_merge(run):
+    # S is the largest table, as for the other semi-joins (the streams do not know their length)
+    S_name = run.table1_name if len(run.table1) >= len(run.table2) else run.table2_name
+    stream1, _, stream2, _ = run.check_tables.stream_tables(run.batch_size, ordered=True)
+    join = MergeJoin(stream1, stream2, run.table1_name, run.table2_name, run.timestamp_diff, True, S_name,
+                     sink=run.sink())
+    join.perform_semi_join()
+    return join
+
+
+def numpy_join_lazy(run):
+    join = NumpyJoin(run.table1, run.table2, run.table1_name, run.table2_name, run.timestamp_diff, True,
+                     sink=run.sink())
+    join.perform_join()
+    return join
+
+
+def sqlite_join_lazy(run):
+    join = SQLiteJoin(run.database1, run.database2, run.timestamp_diff, True, sink=run.sink())
+    try:
+        join.perform_join()
+    finally:
+        join.close()
+    return join
+
+
+def parallel_hash_join_lazy(run):
+    join = ParallelJoin(run.database1, run.database2, run.timestamp_diff, "hash_join", True, sink=run.sink())
+    join.perform_parallel_join()
+    return join
+
+
+STRATEGIES = {
+    "hash_join_fttj": hash_join_fttj,
+    "hash_join_lazy": hash_join_lazy,
+    "hash_join_compact": hash_join_compact,
+    "hash_join_streamed": hash_join_streamed,
+    "hash_join_window": hash_join_window,
+    "merge_join_lazy": merge_join_lazy,
+    "semi_join_fttj": semi_join_fttj,
+    "semi_join_eager": semi_join_eager,
+    "semi_join_lazy": semi_join_lazy,
+    "semi_join_bloom": semi_join_bloom,
+    "semi_join_merge": semi_join_merge,
+    "numpy_join_lazy": numpy_join_lazy,
+    "sqlite_join_lazy": sqlite_join_lazy,
+    "parallel_hash_join_lazy": parallel_hash_join_lazy,
+}
+
+
+def percentile(values, fraction):
+    """
+    Compute a percentile with linear interpolation between the closest ranks.
+
+    :param values: The measurements
+    :param fraction: The percentile as a fraction, e.g. 0.9
+    :return: The percentile value
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class BenchmarkRun:
+    def __init__(self, database1, database2, timestamp_diff, batch_size):
+        """
+        Initialize the BenchmarkRun object, which holds the inputs shared by the strategies of one configuration.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param batch_size: The number of rows fetched per batch by the streaming strategies
+        """
+        self.database1 = database1
+        self.database2 = database2
+        self.timestamp_diff = timestamp_diff
+        self.batch_size = batch_size
+        self.conn1 = sqlite3.connect(database1)
+        self.conn2 = sqlite3.connect(database2)
+        self.check_tables = CheckTables(self.conn1, self.conn2)
+        self.table1, self.table1_name, self.table2, self.table2_name = self.check_tables.load_tables(log_rows=False)
+
+    @staticmethod
+    def sink():
+        # The results are only counted, so that formatting output does not distort the measurements
+        return CountSink()
+
+    def close(self):
+        self.conn1.close()
+        self.conn2.close()
+
+
+class Benchmark:
+    def __init__(self, sizes, selectivities, timestamp_diffs, strategies, repetitions=5, warmup=1, seed=0,
+                 skew=0, batch_size=1000, workdir=None):
+        """
+        Initialize the Benchmark object.
+
+        Every combination of table sizes, selectivity and timestamp difference is generated with the bulk
+        generator and every strategy is timed on it with perf_counter, after warmup runs, with per-row logging
+        disabled.
+
+        :param sizes: List of (size1, size2) pairs
+        :param selectivities: List of fractions of the ids of table2 that exist in table1
+        :param timestamp_diffs: List of timestamp differences in hours
+        :param strategies: Names of the strategies to run (keys of STRATEGIES)
+        :param repetitions: The number of timed runs per strategy
+        :param warmup: The number of untimed runs per strategy
+        :param seed: Seed of the generated tables
+        :param skew: Timestamp jitter in hours of the generated tables
+        :param batch_size: The number of rows fetched per batch by the streaming strategies
+        :param workdir: Directory for the generated databases (a temporary directory if None)
+        """
+        unknown = [name for name in strategies if name not in STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown strategies: {', '.join(unknown)}")
+        self.sizes = sizes
+        self.selectivities = selectivities
+        self.timestamp_diffs = timestamp_diffs
+        self.strategies = strategies
+        self.repetitions = repetitions
+        self.warmup = warmup
+        self.seed = seed
+        self.skew = skew
+        self.batch_size = batch_size
+        self.workdir = workdir
+        self.results = []
+        self.logger = logging.getLogger("Benchmark")
+        self.logger.setLevel(logging.INFO)
+
+    def time_strategy(self, strategy, run):
+        """
+        Time one strategy on one configuration and measure its memory in a separate, untimed run.
+
+        :return: Tuple (counter, list of running times in seconds, peak traced bytes, peak state bytes)
+        """
+        function = STRATEGIES[strategy]
+        times = []
+        counter = None
+        # The strategies only count their results, but the banners they log are silenced as well
+        logging.disable(logging.INFO)
+        try:
+            for _ in range(self.warmup):
+                function(run)
+            for _ in range(self.repetitions):
+                start_time = time.perf_counter()
+                counter = function(run).counter
+                times.append(time.perf_counter() - start_time)
+
+            # tracemalloc slows the join down, so memory is measured in a run of its own
+            with MemoryTracker() as tracker:
+                join = function(run)
+        finally:
+            logging.disable(logging.NOTSET)
+        return counter, times, tracker.peak_bytes, join.peak_state_bytes
+
+    def run_configuration(self, database1, database2, size1, size2, selectivity, timestamp_diff):
+        """
+        Run all strategies on the generated tables with one timestamp difference and record the results.
+        """
+        run = BenchmarkRun(database1, database2, timestamp_diff, self.batch_size)
+
+        try:
+            for strategy in self.strategies:
+                counter, times, peak_traced_bytes, peak_state_bytes = self.time_strategy(strategy, run)
+                record = {
+                    "strategy": strategy,
+                    "size1": size1,
+                    "size2": size2,
+                    "selectivity": selectivity,
+                    "timestamp_diff": timestamp_diff,
+                    "matches": counter,
+                    "repetitions": len(times),
+                    "median": statistics.median(times),
+                    "p10": percentile(times, 0.1),
+                    "p90": percentile(times, 0.9),
+                    "min": min(times),
+                    "max": max(times),
+                    "peak_traced_bytes": peak_traced_bytes,
+                    "peak_state_bytes": peak_state_bytes,
+                }
+                self.results.append(record)
+                self.logger.info(f"{strategy} {size1}x{size2} selectivity={selectivity} "
+                                 f"timestamp_diff={timestamp_diff}: {counter} matches, "
+                                 f"median {record['median']:.6f} s, peak {peak_traced_bytes} bytes")
+        finally:
+            run.close()
+
+    def run(self):
+        """
+        Run all configurations and strategies.
+
+        :return: List of result records
+        """
+        with tempfile.TemporaryDirectory(prefix="benchmark_", dir=self.workdir) as directory:
+            database1 = os.path.join(directory, "database1.db")
+            database2 = os.path.join(directory, "database2.db")
+            for size1, size2 in self.sizes:
+                for selectivity in self.selectivities:
+                    conn1 = sqlite3.connect(database1)
+                    conn2 = sqlite3.connect(database2)
+                    CreateTable(conn1, conn2).create_tables_bulk(size1, size2, self.seed, selectivity, skew=self.skew)
+                    conn1.close()
+                    conn2.close()
+
+                    for timestamp_diff in self.timestamp_diffs:
+                        self.run_configuration(database1, database2, size1, size2, selectivity, timestamp_diff)
+        return self.results
+
+    def write_results(self, path):
+        """
+        Write the results as JSON or CSV, depending on the file extension.
+        """
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=list(self.results[0].keys()) if self.results else [])
+                writer.writeheader()
+                writer.writerows(self.results)
+        else:
+            with open(path, "w") as file:
+                json.dump(self.results, file, indent=2)
+
+
+def parse_size(value):
+    size1, _, size2 = value.partition("x")
+    return int(size1), int(size2 or size1)
+
+
+def main():
+    default_strategies = [name for name in STRATEGIES if name != "numpy_join_lazy" or np is not None]
+
+    parser = argparse.ArgumentParser(description="Benchmark the join strategies on generated tables.")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(10000, 8000)],
+                        help="table sizes as SIZE1xSIZE2")
+    parser.add_argument("--selectivity", type=float, nargs="+", default=[1.0],
+                        help="fractions of the ids of table2 that exist in table1")
+    parser.add_argument("--timestamp-diff", type=float, nargs="+", default=[6], help="timestamp differences in hours")
+    parser.add_argument("--strategies", nargs="+", default=default_strategies, choices=list(STRATEGIES))
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skew", type=float, default=0, help="timestamp jitter of the generated tables in hours")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workdir", help="directory for the generated databases")
+    parser.add_argument("--output", default="benchmark_results.json", help="output file (.json or .csv)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    benchmark = Benchmark(args.sizes, args.selectivity, args.timestamp_diff, args.strategies, args.repetitions,
+                          args.warmup, args.seed, args.skew, args.batch_size, args.workdir)
+    benchmark.run()
+    benchmark.write_results(args.output)
+    logging.info(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
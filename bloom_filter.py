@@ -0,0 +1,69 @@
+import math
+
+
+MASK = (1 << 64) - 1
+
+
+def mix64(value):
+    """
+    Scramble a 64-bit integer (splitmix64 finalizer) so that consecutive ids set unrelated bits.
+    """
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+class BloomFilter:
+    def __init__(self, num_bits, num_hashes):
+        """
+        Initialize the BloomFilter object.
+
+        :param num_bits: The size of the bit array
+        :param num_hashes: The number of bit positions set per key
+        """
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate):
+        """
+        Create a filter sized for a number of keys and a target false-positive rate.
+
+        :param capacity: The expected number of keys
+        :param fp_rate: The target false-positive rate, e.g. 0.01
+        :return: A new BloomFilter
+        """
+        capacity = max(1, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        num_hashes = int(round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def positions(self, key, bucket=None):
+        """
+        Compute the bit positions of a key with double hashing.
+
+        :param key: Integer key (the join id)
+        :param bucket: Optional integer bucket combined with the key (e.g. the hour of the timestamp)
+        :return: Iterator of bit positions
+        """
+        value = mix64(key)
+        if bucket is not None:
+            value = mix64(value ^ bucket)
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key, bucket=None):
+        for position in self.positions(key, bucket):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def contains(self, key, bucket=None):
+        for position in self.positions(key, bucket):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def size_in_bytes(self):
+        return len(self.bits)
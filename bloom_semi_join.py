@@ -0,0 +1,132 @@
+import pickle
+import sys
+import time
+from bloom_filter import BloomFilter
+from columnar_table import id_column, epoch_column
+from memory_usage import sampled_sizeof, sizeof_without_rows, to_mb
+from semi_join import SemiJoin
+
+
+class BloomSemiJoin(SemiJoin):
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, fp_rate=0.01, use_buckets=False,
+                 S_name=None, metrics=None, sink=None):
+        """
+        Initialize the BloomSemiJoin object.
+
+        Instead of shipping S_lookup (every id and timestamp of S) to the site of R, a Bloom filter over the ids
+        of S is shipped, R is probed against it and only the surviving candidates are shipped back to be verified
+        against S.
+
+        :param fp_rate: The target false-positive rate the filter is sized for
+        :param use_buckets: If True, the filter holds (id, hour bucket) pairs so that it also prunes rows whose
+                            id matches but whose timestamp is too far away
+        """
+        super().__init__(table1, table2, table1_name, table2_name, timestamp_diff, True, False, S_name, metrics,
+                         sink)
+        self.fp_rate = fp_rate
+        self.use_buckets = use_buckets
+        self.candidates = 0  # Rows of R that passed the filter
+        self.false_positives = 0  # Candidates whose key was never added to the filter
+        self.false_positive_rate = 0
+        self.filter_bytes = 0  # Size of the Bloom filter
+        self.lookup_bytes = 0  # Size of S_lookup shipped by the plain semi-join
+        self.transfer_bytes = 0  # Filter plus candidates, as they would be shipped between the sites
+        self.running_time = 0
+
+    def buckets(self, epoch):
+        """
+        Get the hour buckets a timestamp of S within the window of the given timestamp of R can fall into.
+        """
+        return range(int((epoch - self.window) // 3600), int((epoch + self.window) // 3600) + 1)
+
+    def in_filter_set(self, S_lookup, key, epoch):
+        """
+        Check whether a row of R truly matches a key added to the filter (used to measure false positives).
+        """
+        if key not in S_lookup:
+            return False
+        return not self.use_buckets or S_lookup[key] // 3600 in self.buckets(epoch)
+
+    def perform_semi_join(self):
+        """
+        Perform the semi-join operation with a Bloom filter.
+
+        Steps:
+        1. Build a Bloom filter over the ids of S (or over (id, hour bucket) pairs).
+        2. Probe every row of R against the filter; the rows that pass are the candidates.
+        3. Verify the candidates against S on id and timestamp difference and add the matches to R1.
+
+        Returns:
+        - R1: The result of the semi-join operation.
+        - size_used: The memory size (in MB) used by the result, the filter, the candidates and S_lookup.
+        """
+        start_time = time.perf_counter()
+        metrics = self.metrics
+        metrics.start()
+        metrics.tuples_read1 = len(self.table1)
+        metrics.tuples_read2 = len(self.table2)
+
+        S, R = self.get_roles()
+        S_ids = id_column(S)
+        S_epochs = epoch_column(S)
+
+        self.logger.info("\n============================== Semi Join Bloom ==============================")
+
+        # Site of S: build the filter
+        # In bucket mode every row of R probes several buckets, so each probe gets a share of the target rate
+        probes_per_row = len(self.buckets(0)) if self.use_buckets else 1
+        bloom = BloomFilter.for_capacity(len(S_ids), self.fp_rate / probes_per_row)
+        if self.use_buckets:
+            for key, epoch in zip(S_ids, S_epochs):
+                bloom.add(key, epoch // 3600)
+        else:
+            for key in S_ids:
+                bloom.add(key)
+
+        # Site of R: probe the filter
+        candidates = []
+        for row, epoch in zip(R, epoch_column(R)):
+            key = row[0]
+            metrics.probes += 1
+            if self.use_buckets:
+                passed = any(bloom.contains(key, bucket) for bucket in self.buckets(epoch))
+            else:
+                passed = bloom.contains(key)
+            if passed:
+                candidates.append((row, epoch))
+
+        # Site of S: verify the candidates
+        S_lookup = dict(zip(S_ids, S_epochs))
+        R1 = []
+        for row, epoch in candidates:
+            key = row[0]
+            if key in S_lookup:
+                metrics.key_hits += 1
+                if abs(epoch - S_lookup[key]) < self.window:
+                    self.add_result(R1, row)
+                else:
+                    metrics.record_rejection(key)
+
+        self.running_time = time.perf_counter() - start_time
+
+        # Only the probe values of the candidates would travel back to the site of S
+        shipped_candidates = [(row[0], epoch) for row, epoch in candidates]
+        self.candidates = len(candidates)
+        self.filter_bytes = bloom.size_in_bytes()
+        self.lookup_bytes = len(pickle.dumps(S_lookup, pickle.HIGHEST_PROTOCOL))
+        self.transfer_bytes = self.filter_bytes + len(pickle.dumps(shipped_candidates, pickle.HIGHEST_PROTOCOL))
+
+        # A false positive is a candidate whose key (id, or id and bucket) was never added to the filter
+        negatives = sum(1 for row, epoch in zip(R, epoch_column(R)) if not self.in_filter_set(S_lookup, row[0], epoch))
+        self.false_positives = sum(1 for row, epoch in candidates if not self.in_filter_set(S_lookup, row[0], epoch))
+        self.false_positive_rate = self.false_positives / negatives if negatives else 0
+
+        self.peak_state_bytes = (sys.getsizeof(R1) + sampled_sizeof(candidates, sizeof=sizeof_without_rows) +
+                                 sampled_sizeof(S_lookup, bloom))
+        self.sink.flush()
+        metrics.sample(len(S_lookup), len(candidates))
+        metrics.finish()
+
+        size_used = to_mb(self.peak_state_bytes)
+
+        return R1, size_used
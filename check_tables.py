@@ -1,4 +1,5 @@
 import logging
+from columnar_table import ColumnarTable
 
 
 class CheckTables:
@@ -27,25 +28,30 @@ class CheckTables:
         return result[0] if result else None
 
     @staticmethod
-    def check_table(table, table_name):
+    def check_table(table, table_name, log_rows=True):
         """
         Check if a table is empty and print its contents if it is not empty.
 
         :param table: The table to check
         :param table_name: The name of the table
+        :param log_rows: Whether every row is logged or only the number of rows
         """
         if len(table) > 0:
             logging.info(f"{table_name}")
             # Log the retrieved data
-            for row in table:
-                logging.info(row)
+            if log_rows:
+                for row in table:
+                    logging.info(row)
+            else:
+                logging.info(f"{len(table)} rows")
         else:
             logging.info(f"{table_name} is empty.")
 
-    def check_tables(self):
+    def check_tables(self, log_rows=True):
         """
         Check the tables in the connected databases.
 
+        :param log_rows: Whether every row of the tables is logged
         :return: The retrieved tables as tuples
         """
 
@@ -59,7 +65,80 @@ class CheckTables:
         table2 = self.cursor2.fetchall()
 
         # Check if the tables are filled
-        self.check_table(table1, table1_name)
-        self.check_table(table2, table2_name)
+        self.check_table(table1, table1_name, log_rows)
+        self.check_table(table2, table2_name, log_rows)
+
+        return table1, table1_name, table2, table2_name
+
+    def load_tables(self, log_rows=True):
+        """
+        Check the tables in the connected databases and load them in columnar form.
+
+        :param log_rows: Whether every row of the tables is logged
+        :return: The retrieved tables as ColumnarTable objects
+        """
+        table1, table1_name, table2, table2_name = self.check_tables(log_rows)
+
+        return ColumnarTable(table1), table1_name, ColumnarTable(table2), table2_name
+
+    @staticmethod
+    def stream_table(cursor, table_name, batch_size, ordered=False):
+        """
+        Stream the rows of a table in batches instead of fetching the whole table.
+
+        :param cursor: Database cursor
+        :param table_name: The name of the table
+        :param batch_size: The number of rows fetched per batch
+        :param ordered: Whether the rows are returned in id order (free for the INTEGER PRIMARY KEY id)
+        :return: Iterator over the rows of the table
+        """
+        cursor.execute(f"SELECT * FROM {table_name}" + (" ORDER BY id" if ordered else ""))
+        try:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def row_fetcher(conn, table_name):
+        """
+        Get a function reading a row of a table by its id, the INTEGER PRIMARY KEY and thus the rowid of the table.
+
+        :param conn: Connection to the database
+        :param table_name: The name of the table
+        :return: Function returning the row with a given id
+        """
+        query = f"SELECT * FROM {table_name} WHERE id = ?"
+
+        def fetch(row_id):
+            return conn.execute(query, (row_id,)).fetchone()
+        return fetch
+
+    def row_fetchers(self):
+        """
+        Get the functions reading a row of each table by its id, e.g. for the compact hash tables of HashJoin.
+
+        :return: Tuple (fetch1, fetch2)
+        """
+        return (self.row_fetcher(self.conn1, self.get_table_name(self.cursor1)),
+                self.row_fetcher(self.conn2, self.get_table_name(self.cursor2)))
+
+    def stream_tables(self, batch_size=1000, ordered=False):
+        """
+        Stream the tables in the connected databases with cursor.fetchmany.
+
+        :param batch_size: The number of rows fetched per batch
+        :param ordered: Whether the rows are returned in id order
+        :return: The tables as row iterators together with their names
+        """
+        table1_name = self.get_table_name(self.cursor1)
+        table2_name = self.get_table_name(self.cursor2)
+
+        # Each stream gets its own cursor so that both can be read at the same time
+        table1 = self.stream_table(self.conn1.cursor(), table1_name, batch_size, ordered)
+        table2 = self.stream_table(self.conn2.cursor(), table2_name, batch_size, ordered)
 
         return table1, table1_name, table2, table2_name
@@ -0,0 +1,78 @@
+from array import array
+from datetime import datetime
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(timestamp):
+    """
+    Convert a "%Y-%m-%d %H:%M:%S" timestamp string to epoch seconds.
+
+    :param timestamp: Timestamp string as stored in the tables
+    :return: Seconds since 1970-01-01 00:00:00 as an integer
+    """
+    return int((datetime.fromisoformat(timestamp) - EPOCH).total_seconds())
+
+
+class ColumnarTable:
+    def __init__(self, rows):
+        """
+        Initialize the ColumnarTable object.
+
+        The ids and the timestamps (as epoch seconds) are stored in typed columns next to the original rows, so
+        the timestamps are parsed once at load time instead of on every comparison.
+
+        :param rows: The rows of the table as fetched from the database
+        """
+        self.rows = rows
+        self.ids = array('q', (row[0] for row in rows))
+        self.timestamps = array('q', (to_epoch(row[3]) for row in rows))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+
+def id_column(table):
+    """
+    Get the id column of a table.
+
+    :param table: A ColumnarTable or a list of rows
+    :return: The ids of the table
+    """
+    if isinstance(table, ColumnarTable):
+        return table.ids
+    return array('q', (row[0] for row in table))
+
+
+def epoch_column(table):
+    """
+    Get the timestamp column of a table as epoch seconds.
+
+    :param table: A ColumnarTable or a list of rows
+    :return: The timestamps of the table in epoch seconds
+    """
+    if isinstance(table, ColumnarTable):
+        return table.timestamps
+    return array('q', (to_epoch(row[3]) for row in table))
+
+
+def iter_with_epochs(table, parse=True):
+    """
+    Iterate over the rows of a table together with their timestamps in epoch seconds.
+
+    :param table: A ColumnarTable, a list of rows or any iterator of rows (e.g. a streaming cursor)
+    :param parse: Whether the timestamps are needed; if False, None is yielded instead of the epoch
+    :return: Iterator of (row, epoch) pairs
+    """
+    if isinstance(table, ColumnarTable):
+        return zip(table.rows, table.timestamps)
+    if parse:
+        return ((row, to_epoch(row[3])) for row in table)
+    return ((row, None) for row in table)
@@ -0,0 +1,139 @@
+from array import array
+
+
+EMPTY = -1  # Row reference of an empty slot
+FIBONACCI = 0x9E3779B97F4A7C15  # 2^64 / golden ratio, spreads consecutive ids over the slots
+MASK = (1 << 64) - 1
+MAX_LOAD = 0.75
+
+
+class CompactHashTable:
+    def __init__(self, fetch=None, capacity=8, reference=None):
+        """
+        Initialize the CompactHashTable object.
+
+        A hash table with open addressing (linear probing) for integer join keys. Instead of a dict holding the row
+        tuples, it keeps the keys, the timestamps (in epoch seconds) and a reference to each row in three typed
+        arrays, 24 bytes per slot, and fetches a row only when it is read, e.g. when a match is emitted.
+
+        With fetch, the table is used like the hash tables of HashJoin: table[key] = (row, epoch) stores the key, the
+        epoch and reference(row), and table[key] returns (fetch(reference), epoch). The reference can be the rowid
+        of the row, fetch reading it back from the database, so that the row is not kept in memory at all. Without
+        a reference function, it is the offset of the row, the number of rows inserted before it, so rows must be
+        inserted in the order fetch returns them (the order of the table).
+        Without fetch, it is used like the lookup dictionaries of SemiJoin: table[key] = epoch and table[key] returns
+        the epoch. A None epoch is stored as 0.
+
+        :param fetch: Function returning the row of a reference, e.g. the __getitem__ of a ColumnarTable or a list,
+                      or a function of CheckTables.row_fetchers reading the row by rowid
+        :param capacity: Number of keys to size the table for, it grows when it fills up
+        :param reference: Function returning the reference of a row, a non-negative integer (the row offset if None)
+        """
+        self.fetch = fetch
+        self.reference = reference
+        num_slots = 8
+        while num_slots * MAX_LOAD < capacity:
+            num_slots *= 2
+        self.allocate(num_slots)
+        self.size = 0  # Number of keys in the table
+        self.next_offset = 0  # Offset of the next row
+
+    def allocate(self, num_slots):
+        self.keys = array('q', bytes(8 * num_slots))
+        self.epochs = array('q', bytes(8 * num_slots))
+        self.offsets = array('q', [EMPTY]) * num_slots
+        self.mask = num_slots - 1
+        self.shift = 64 - num_slots.bit_length() + 1
+
+    def home(self, key):
+        """
+        The slot a key hashes to (Fibonacci hashing).
+        """
+        return ((key * FIBONACCI) & MASK) >> self.shift
+
+    def find(self, key):
+        """
+        The slot holding a key, or the empty slot where it would be inserted.
+        """
+        keys, offsets, mask = self.keys, self.offsets, self.mask
+        slot = ((key * FIBONACCI) & MASK) >> self.shift
+        while offsets[slot] != EMPTY and keys[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+
+    def resize(self, num_slots):
+        keys, epochs, offsets = self.keys, self.epochs, self.offsets
+        self.allocate(num_slots)
+        for slot in range(len(offsets)):
+            if offsets[slot] != EMPTY:
+                new_slot = self.find(keys[slot])
+                self.keys[new_slot] = keys[slot]
+                self.epochs[new_slot] = epochs[slot]
+                self.offsets[new_slot] = offsets[slot]
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.offsets[self.find(key)] != EMPTY
+
+    def __getitem__(self, key):
+        slot = self.find(key)
+        if self.offsets[slot] == EMPTY:
+            raise KeyError(key)
+        if self.fetch is None:
+            return self.epochs[slot]
+        return self.fetch(self.offsets[slot]), self.epochs[slot]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def get_epoch(self, key, default=None):
+        """
+        Get the epoch stored for a key without fetching its row.
+        """
+        slot = self.find(key)
+        return default if self.offsets[slot] == EMPTY else self.epochs[slot]
+
+    def __setitem__(self, key, value):
+        epoch = value if self.fetch is None else value[1]
+        slot = self.find(key)
+        if self.offsets[slot] == EMPTY:
+            self.size += 1
+        self.keys[slot] = key
+        self.epochs[slot] = epoch if epoch is not None else 0
+        if self.reference is None:
+            self.offsets[slot] = self.next_offset
+            self.next_offset += 1
+        else:
+            self.offsets[slot] = self.reference(value[0])
+
+        if self.size > len(self.offsets) * MAX_LOAD:
+            self.resize(len(self.offsets) * 2)
+
+    def __delitem__(self, key):
+        """
+        Remove a key, shifting back the keys that follow it in the probe sequence so that no tombstones are needed.
+        """
+        keys, epochs, offsets, mask = self.keys, self.epochs, self.offsets, self.mask
+        slot = self.find(key)
+        if offsets[slot] == EMPTY:
+            raise KeyError(key)
+        offsets[slot] = EMPTY
+        self.size -= 1
+
+        following = (slot + 1) & mask
+        while offsets[following] != EMPTY:
+            # The key can fill the hole unless its home lies cyclically between the hole and its slot
+            distance = (following - self.home(keys[following])) & mask
+            if distance >= (following - slot) & mask:
+                keys[slot] = keys[following]
+                epochs[slot] = epochs[following]
+                offsets[slot] = offsets[following]
+                offsets[following] = EMPTY
+                slot = following
+            following = (following + 1) & mask
+
+    def __iter__(self):
+        keys, offsets = self.keys, self.offsets
+        return (keys[slot] for slot in range(len(offsets)) if offsets[slot] != EMPTY)
@@ -0,0 +1,170 @@
+import queue
+import sqlite3
+import threading
+import time
+from check_tables import CheckTables
+
+
+POLL_INTERVAL = 0.05  # Seconds a blocked reader waits before checking again whether it should stop
+
+
+class SourceReader(threading.Thread):
+    def __init__(self, database, table_name, side, output, ready, stop, batch_size, latency):
+        """
+        Initialize the SourceReader object.
+
+        :param database: Path to the database file
+        :param table_name: The name of the table to read
+        :param side: 1 or 2, the side of the join this reader feeds
+        :param output: Bounded queue the batches are put into
+        :param ready: Semaphore released once for every item put into the queue
+        :param stop: Event set by the consumer when it no longer reads the queue
+        :param batch_size: The number of rows fetched per batch
+        :param latency: Artificial delay in seconds before every batch, used to simulate a slow source
+        """
+        super().__init__(daemon=True)
+        self.database = database
+        self.table_name = table_name
+        self.side = side
+        self.output = output
+        self.ready = ready
+        self.stop = stop
+        self.batch_size = batch_size
+        self.latency = latency
+        self.error = None
+
+    def put(self, item):
+        """
+        Put an item into the queue, blocking while it is full, which throttles a source that is faster than the
+        join.
+
+        :return: False if the consumer stopped before the item could be put, True otherwise
+        """
+        while not self.stop.is_set():
+            try:
+                self.output.put(item, timeout=POLL_INTERVAL)
+            except queue.Full:
+                continue
+            self.ready.release()
+            return True
+        return False
+
+    def run(self):
+        """
+        Read the table in batches with a connection owned by this thread and put them into the queue.
+
+        A None item marks the end of the table. The reader also ends early once the stop event is set.
+        """
+        # sqlite3 connections cannot be shared between threads, so each reader opens its own
+        conn = sqlite3.connect(self.database)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM {self.table_name}")
+            while not self.stop.is_set():
+                if self.latency and self.stop.wait(self.latency):
+                    break
+                batch = cursor.fetchmany(self.batch_size)
+                if not batch or not self.put(batch):
+                    break
+        except Exception as error:
+            self.error = error
+        finally:
+            conn.close()
+            self.put(None)
+
+
+class DualSourceReader:
+    def __init__(self, database1, database2, batch_size=1000, queue_size=4, latency1=0.0, latency2=0.0):
+        """
+        Initialize the DualSourceReader object.
+
+        Each database is read by its own thread into its own bounded queue, and iterating over this object
+        yields batches from whichever source has data ready.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param batch_size: The number of rows fetched per batch
+        :param queue_size: The maximum number of batches buffered per source
+        :param latency1: Artificial delay in seconds before every batch of the first source
+        :param latency2: Artificial delay in seconds before every batch of the second source
+        """
+        self.database1 = database1
+        self.database2 = database2
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.latency1 = latency1
+        self.latency2 = latency2
+        self.table1_name = self.read_table_name(database1)
+        self.table2_name = self.read_table_name(database2)
+        self.wait_time = 0  # Seconds the consumer spent waiting for both sources
+
+    @staticmethod
+    def read_table_name(database):
+        """
+        Get the table name of a database file.
+
+        :param database: Path to the database file
+        :return: Table name
+        """
+        conn = sqlite3.connect(database)
+        try:
+            return CheckTables.get_table_name(conn.cursor())
+        finally:
+            conn.close()
+
+    def __iter__(self):
+        """
+        Start both readers and yield their batches as they become available.
+
+        :return: Iterator of (side, batch) pairs, where side is 1 or 2; an empty batch marks the end of a side
+
+        If the iteration ends early (an error, or the consumer closing the iterator), both readers are stopped
+        and joined, so that none of them stays blocked on a full queue with its connection open.
+        """
+        ready = threading.Semaphore(0)
+        stop = threading.Event()
+        queues = {1: queue.Queue(self.queue_size), 2: queue.Queue(self.queue_size)}
+        readers = {
+            1: SourceReader(self.database1, self.table1_name, 1, queues[1], ready, stop, self.batch_size,
+                            self.latency1),
+            2: SourceReader(self.database2, self.table2_name, 2, queues[2], ready, stop, self.batch_size,
+                            self.latency2),
+        }
+        for reader in readers.values():
+            reader.start()
+
+        active = {1, 2}
+        preferred = 1
+        self.wait_time = 0
+        try:
+            while active:
+                wait_start = time.perf_counter()
+                ready.acquire()
+                self.wait_time += time.perf_counter() - wait_start
+
+                # Alternate the preferred side so that neither source starves the other when both have data
+                other = 2 if preferred == 1 else 1
+                try:
+                    side, batch = preferred, queues[preferred].get_nowait()
+                except queue.Empty:
+                    side, batch = other, queues[other].get_nowait()
+                preferred = other
+
+                if batch is None:
+                    active.discard(side)
+                    if readers[side].error is not None:
+                        raise readers[side].error
+                    yield side, []
+                else:
+                    yield side, batch
+        finally:
+            stop.set()
+            # Free the queues so that a reader blocked on a full one sees the stop event without waiting
+            for output in queues.values():
+                while True:
+                    try:
+                        output.get_nowait()
+                    except queue.Empty:
+                        break
+            for reader in readers.values():
+                reader.join()
@@ -1,5 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 import random
+import sqlite3
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the timestamps are then generated row by row
+    np = None
+
+
+HOURS = [f"{hour:02d}:" for hour in range(24)]
+MINUTES_SECONDS = [f"{minute:02d}:{second:02d}" for minute in range(60) for second in range(60)]
 
 
 class CreateTable:
@@ -52,9 +63,199 @@ class CreateTable:
         # Commit the changes
         connection.commit()
 
+    def append_rows(self, connection, cursor, table_name, num_records, seed=None):
+        """
+        Append rows to an existing table, as the production feeds do. The rows get the next ids and continue the
+        timestamps of the table.
+
+        :param num_records: The number of rows to append
+        """
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table_name}')
+        last_id = cursor.fetchone()[0]
+
+        for i in range(last_id + 1, last_id + 1 + num_records):
+            name = f"Name_{random.randint(1, 30000000)}"
+            email = f"email_{random.randint(1, 30000000)}@example.com"
+            timestamp = self.generate_timestamp(i, seed)
+            cursor.execute(f'INSERT INTO {table_name} (name, email, timestamp) VALUES (?, ?, ?)',
+                           (name, email, timestamp))
+
+        connection.commit()
+
     def create_tables(self, size1, size2, seed=None):
         # Create table1
         self.create_table(self.conn1, self.cursor1, 'table1', size1, seed)
 
         # Create table2
         self.create_table(self.conn2, self.cursor2, 'table2', size2, seed+100)
+
+    @staticmethod
+    def generate_timestamps(count, seed, rows_per_day=1, skew=0, batch_size=100000):
+        """
+        Generate the timestamps of rows 1..count in batches.
+
+        Like generate_timestamp, row i falls on day i (with rows_per_day = 1) at a random time of day, but a single
+        random generator seeded once is used for the whole column. With NumPy, every batch is drawn and formatted
+        as arrays; without it, the strings are formatted row by row from cached dates. The values are deterministic
+        for a given seed and batch size (and for whether NumPy is installed) but differ from generate_timestamp.
+
+        :param count: The number of timestamps
+        :param seed: Seed of the random generator
+        :param rows_per_day: The number of consecutive rows that fall on the same day
+        :param skew: Standard deviation in hours of a Gaussian jitter added to every timestamp; larger values
+                     make the input less ordered in time and the timestamp predicate more selective
+        :param batch_size: The number of timestamps per batch
+        :return: Generator of lists of timestamp strings
+        """
+        start = int((datetime(2023, 6, 1) - datetime(1970, 1, 1)).total_seconds())
+        jitter = skew * 3600
+        if np is not None:
+            rng = np.random.RandomState(seed)
+            for first in range(1, count + 1, batch_size):
+                ids = np.arange(first, min(first + batch_size, count + 1), dtype=np.int64)
+                epochs = start + (ids // rows_per_day) * 86400 + (rng.random_sample(len(ids)) * 86400).astype(np.int64)
+                if jitter:
+                    epochs += rng.normal(0, jitter, len(ids)).astype(np.int64)
+                strings = np.datetime_as_string(epochs.astype("datetime64[s]"))  # "%Y-%m-%dT%H:%M:%S"
+                yield np.char.replace(strings, "T", " ").tolist()
+            return
+
+        rng = random.Random(seed)
+        epoch_ordinal = date(1970, 1, 1).toordinal()
+        dates = {}  # day since epoch -> "%Y-%m-%d "
+        for first in range(1, count + 1, batch_size):
+            timestamps = []
+            for i in range(first, min(first + batch_size, count + 1)):
+                epoch = start + (i // rows_per_day) * 86400 + int(rng.random() * 86400)
+                if jitter:
+                    epoch += int(rng.gauss(0, jitter))
+                day, seconds = divmod(epoch, 86400)
+                prefix = dates.get(day)
+                if prefix is None:
+                    prefix = date.fromordinal(epoch_ordinal + day).isoformat() + " "
+                    dates[day] = prefix
+                hour, seconds = divmod(seconds, 3600)
+                timestamps.append(prefix + HOURS[hour] + MINUTES_SECONDS[seconds])
+            yield timestamps
+
+    @staticmethod
+    def generate_rows(num_records, seed, selectivity=1, id_offset=0, rows_per_day=1, skew=0, num_ids=None,
+                      batch_size=100000):
+        """
+        Generate the rows of a table for a bulk insert, one batch at a time so that the whole table is never held
+        in memory.
+
+        :param num_records: The size of the table (rows 1..num_records - 1 are generated, like create_table)
+        :param seed: Seed of the random generator
+        :param selectivity: The fraction of the rows that get an id in 1..num_ids - 1: row i keeps the id i if it
+                            is below num_ids, or else gets one of these ids not taken yet, while it lasts. The other
+                            rows get the id i + id_offset, so that they do not match a table holding those ids.
+        :param id_offset: The offset of the non-matching ids, at least max(num_records, num_ids) so that they do not
+                          collide with the matching ones
+        :param num_ids: The ids 1..num_ids - 1 the rows can match (num_records if None)
+        :param batch_size: The number of rows per batch
+        :return: Generator of lists of (id, name, email, timestamp) rows
+        """
+        if num_ids is None:
+            num_ids = num_records
+        rng = random.Random(seed)
+        free_ids = []  # Ids below num_ids left over by the non-matching rows
+        i = 0
+        for timestamps in CreateTable.generate_timestamps(num_records - 1, seed, rows_per_day, skew, batch_size):
+            rows = []
+            for timestamp in timestamps:
+                i += 1
+                matching = selectivity >= 1 or rng.random() < selectivity
+                if i >= num_ids and matching and free_ids:
+                    # Draw one of the free ids, replacing it by the last one
+                    index = rng.randrange(len(free_ids))
+                    key = free_ids[index]
+                    free_ids[index] = free_ids[-1]
+                    free_ids.pop()
+                elif i < num_ids and matching:
+                    key = i
+                else:
+                    key = i + id_offset
+                    if i < num_ids:
+                        free_ids.append(i)
+                rows.append((key, f"Name_{int(rng.random() * 30000000) + 1}",
+                             f"email_{int(rng.random() * 30000000) + 1}@example.com", timestamp))
+            yield rows
+
+    @staticmethod
+    def bulk_create_table(connection, table_name, batches):
+        """
+        Create a table and insert the rows with executemany, one batch per call, inside a single transaction.
+
+        Journaling and syncing are relaxed while the table is built and restored afterwards.
+
+        :param connection: Connection to the database
+        :param table_name: The name of the table
+        :param batches: Iterable of lists of rows to insert, as generated by generate_rows
+        """
+        cursor = connection.cursor()
+        journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+        cursor.execute("PRAGMA synchronous = OFF")
+        try:
+            cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
+            cursor.execute(f'''CREATE TABLE {table_name}
+                              (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                               name TEXT,
+                               email TEXT,
+                               timestamp TEXT)''')
+            for rows in batches:
+                cursor.executemany(f'INSERT INTO {table_name} (id, name, email, timestamp) VALUES (?, ?, ?, ?)',
+                                   rows)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+            cursor.execute(f"PRAGMA synchronous = {synchronous}")
+
+    @staticmethod
+    def bulk_create_database(database, table_name, num_records, seed, selectivity=1, id_offset=0, rows_per_day=1,
+                             skew=0, batch_size=100000, num_ids=None):
+        """
+        Generate and bulk insert a table into a database file with a connection of its own, so that it can run
+        in a separate process.
+        """
+        batches = CreateTable.generate_rows(num_records, seed, selectivity, id_offset, rows_per_day, skew, num_ids,
+                                            batch_size)
+        connection = sqlite3.connect(database)
+        try:
+            CreateTable.bulk_create_table(connection, table_name, batches)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_database_file(connection):
+        return connection.execute("PRAGMA database_list").fetchone()[2]
+
+    def create_tables_bulk(self, size1, size2, seed=0, selectivity=1, rows_per_day=1, skew=0, batch_size=100000,
+                           parallel=False):
+        """
+        Create both tables with the bulk generator.
+
+        :param selectivity: The fraction of the ids of table2 that also exist in table1 (at most
+                            (size1 - 1) / (size2 - 1), as table1 only has size1 - 1 ids)
+        :param rows_per_day: The number of consecutive rows that fall on the same day
+        :param skew: Standard deviation in hours of the jitter added to the timestamps
+        :param batch_size: The number of rows per executemany call
+        :param parallel: If True, the two databases are generated in two processes at the same time
+        """
+        table1 = (self.get_database_file(self.conn1), 'table1', size1, seed, 1, 0, rows_per_day, skew, batch_size)
+        table2 = (self.get_database_file(self.conn2), 'table2', size2, seed + 100, selectivity, max(size1, size2),
+                  rows_per_day, skew, batch_size, size1)
+
+        if parallel:
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(self.bulk_create_database, *args) for args in (table1, table2)]
+                for future in futures:
+                    future.result()
+        else:
+            self.bulk_create_database(*table1)
+            self.bulk_create_database(*table2)
@@ -0,0 +1,178 @@
+import logging
+import sqlite3
+from result_sinks import LoggingSink
+from sqlite_join import select_columns
+
+
+class IncrementalJoin:
+    def __init__(self, database1, database2, state_database, timestamp_diff, sink=None):
+        """
+        Initialize the IncrementalJoin object.
+
+        A lazy join of append-only tables that only processes the rows appended since the previous run. The state
+        database keeps a compact index of the rows already joined, (id, timestamp in epoch seconds) per table, and
+        the rowid watermark of each table. A run reads the new rows of each table (rowid above the watermark) and
+        emits the results they add:
+
+            delta1 join state2  +  state1 join delta2  +  delta1 join delta2
+
+        so its cost is proportional to the number of new rows, not to the size of the tables. The rows of the
+        results are fetched from the source tables by id. The results of all runs together are the lazy join of the
+        tables.
+
+        If a table was recreated since the previous run (the row at its watermark is gone or different), the state
+        is dropped and the run joins the tables from scratch.
+
+        Only the lazy join is incremental: with FTTJ, a new row can let old rows pass the timestamp filter, which
+        changes the results between old rows.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param state_database: Path to the database file holding the state (created if missing)
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param sink: ResultSink the new join results are handed to (a LoggingSink if None)
+        """
+        self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.counter = 0  # Number of results added by the last run
+        self.delta1 = 0  # Number of new rows of table1 in the last run
+        self.delta2 = 0  # Number of new rows of table2 in the last run
+        self.conn = sqlite3.connect(state_database)
+        self.conn.execute("ATTACH DATABASE ? AS src1", (database1,))
+        self.conn.execute("ATTACH DATABASE ? AS src2", (database2,))
+        self.table1_name = self.get_table_name("src1")
+        self.table2_name = self.get_table_name("src2")
+        self.tables = {1: f"src1.{self.table1_name}", 2: f"src2.{self.table2_name}"}
+        self.logger = logging.getLogger("IncrementalJoin")
+        self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger, "Matching records => ")
+        self.create_state()
+
+    def get_table_name(self, schema):
+        """
+        Get the table name of an attached database.
+
+        :param schema: The schema name of the database ("src1" or "src2")
+        :return: Table name
+        """
+        cursor = self.conn.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def create_state(self):
+        """
+        Create the state tables if they do not exist yet.
+        """
+        for side in (1, 2):
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS state{side} (id INTEGER PRIMARY KEY, ts_epoch INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS watermarks "
+                          "(side INTEGER PRIMARY KEY, last_rowid INTEGER, name TEXT, email TEXT, timestamp TEXT)")
+        self.conn.commit()
+
+    def reset_state(self):
+        for side in (1, 2):
+            self.conn.execute(f"DELETE FROM state{side}")
+        self.conn.execute("DELETE FROM watermarks")
+
+    def get_watermark(self, side):
+        """
+        Get the watermark of a table.
+
+        :return: Tuple (last_rowid, row) where row is (name, email, timestamp) of the row at last_rowid, or (0, None)
+                 if the table was never joined
+        """
+        result = self.conn.execute("SELECT last_rowid, name, email, timestamp FROM watermarks WHERE side = ?",
+                                   (side,)).fetchone()
+        return (0, None) if result is None else (result[0], tuple(result[1:]))
+
+    def get_row(self, side, rowid):
+        """
+        Get (name, email, timestamp) of the row of a table at a rowid, or None if there is none.
+        """
+        result = self.conn.execute(f"SELECT name, email, timestamp FROM {self.tables[side]} WHERE rowid = ?",
+                                   (rowid,)).fetchone()
+        return None if result is None else tuple(result)
+
+    def table_recreated(self, side):
+        """
+        Check whether a table was recreated since the previous run: the row at its watermark changed.
+        """
+        last_rowid, row = self.get_watermark(side)
+        return last_rowid > 0 and self.get_row(side, last_rowid) != row
+
+    def load_delta(self, side):
+        """
+        Copy the ids and timestamps of the rows appended to a table since the previous run into temp.delta<side>.
+
+        :return: The rowid of the last row loaded (the new watermark)
+        """
+        table = self.tables[side]
+        last_rowid = self.get_watermark(side)[0]
+        high = self.conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+
+        self.conn.execute(f"DROP TABLE IF EXISTS temp.delta{side}")
+        self.conn.execute(f"CREATE TEMP TABLE delta{side} (id INTEGER PRIMARY KEY, ts_epoch INTEGER)")
+        cursor = self.conn.execute(f"INSERT INTO temp.delta{side} "
+                                   f"SELECT id, CAST(strftime('%s', timestamp) AS INTEGER) FROM {table} "
+                                   f"WHERE rowid > ? AND rowid <= ?", (last_rowid, high))
+        if side == 1:
+            self.delta1 = cursor.rowcount
+        else:
+            self.delta2 = cursor.rowcount
+        return max(high, last_rowid)
+
+    def iter_new_results(self):
+        """
+        Stream the results added by the new rows.
+
+        :return: Iterator of (id, record1, record2) triples
+        """
+        within = "abs(d1.ts_epoch - d2.ts_epoch) < :window"
+        query = (f"SELECT {select_columns('a')}, {select_columns('b')} FROM ("
+                 f"SELECT d1.id FROM temp.delta1 AS d1 JOIN main.state2 AS d2 ON d2.id = d1.id WHERE {within} "
+                 f"UNION ALL "
+                 f"SELECT d2.id FROM main.state1 AS d1 JOIN temp.delta2 AS d2 ON d2.id = d1.id WHERE {within} "
+                 f"UNION ALL "
+                 f"SELECT d1.id FROM temp.delta1 AS d1 JOIN temp.delta2 AS d2 ON d2.id = d1.id WHERE {within}"
+                 f") AS p JOIN {self.tables[1]} AS a ON a.id = p.id JOIN {self.tables[2]} AS b ON b.id = p.id")
+
+        for row in self.conn.execute(query, {"window": self.window}):
+            yield row[0], row[:4], row[4:]
+
+    def save_state(self, side, last_rowid):
+        """
+        Add the new rows of a table to its state and advance its watermark.
+        """
+        self.conn.execute(f"INSERT OR REPLACE INTO state{side} SELECT id, ts_epoch FROM temp.delta{side}")
+        self.conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)",
+                          (side, last_rowid) + (self.get_row(side, last_rowid) or (None, None, None)))
+        self.conn.execute(f"DROP TABLE temp.delta{side}")
+
+    def perform_incremental_join(self):
+        """
+        Join the rows appended since the previous run and save the state, in one transaction.
+
+        :return: The number of results added
+        """
+        self.logger.info("\n============================== Incremental Join ==============================")
+        if self.table_recreated(1) or self.table_recreated(2):
+            self.logger.info("A table was recreated, joining from scratch")
+            self.reset_state()
+
+        last_rowid1 = self.load_delta(1)
+        last_rowid2 = self.load_delta(2)
+
+        self.counter = 0
+        for triple in self.iter_new_results():
+            self.sink.write(triple)
+            self.counter += 1
+        self.sink.flush()
+
+        self.save_state(1, last_rowid1)
+        self.save_state(2, last_rowid2)
+        self.conn.commit()
+        return self.counter
+
+    def close(self):
+        self.conn.close()
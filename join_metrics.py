@@ -0,0 +1,97 @@
+import time
+
+
+EVENTS = ("match", "predicate_rejection", "sample", "finish")
+
+
+class JoinMetrics:
+    def __init__(self, timing=False, sample_interval=1000):
+        """
+        Initialize the JoinMetrics object, which collects what a join operator did.
+
+        Callbacks can be registered with add_hook for the events:
+        - "match": called with the result of every match
+        - "predicate_rejection": called with the key of every id match that failed the timestamp predicate
+        - "sample": called with (tuples read, size of the first hash table, size of the second hash table)
+        - "finish": called with the metrics object once the join is done
+
+        :param timing: Whether the time spent parsing, probing and producing output is measured (this costs a
+                       few clock reads per tuple, which can double the running time of a hash join)
+        :param sample_interval: The number of tuples read between two samples of the hash table sizes
+        """
+        self.timing = timing
+        self.sample_interval = sample_interval
+        self.tuples_read1 = 0  # Tuples read from table1
+        self.tuples_read2 = 0  # Tuples read from table2
+        self.probes = 0  # Lookups of a key in the other hash table
+        self.key_hits = 0  # Lookups that found the key
+        self.predicate_rejections = 0  # Key hits that failed the timestamp predicate
+        self.matches = 0
+        self.hash_table_sizes = []  # Samples of (tuples read, size of the first table, size of the second table)
+        self.parse_time = 0  # Seconds spent reading and parsing input tuples
+        self.probe_time = 0  # Seconds spent probing and inserting
+        self.output_time = 0  # Seconds spent producing the results
+        self.start_time = None
+        self.time_to_first_match = None
+        self.total_time = None
+        self.hooks = {event: [] for event in EVENTS}
+
+    def add_hook(self, event, callback):
+        """
+        Register a callback for an event.
+
+        :param event: One of "match", "predicate_rejection", "sample" or "finish"
+        :param callback: Function called with the data of the event
+        """
+        if event not in self.hooks:
+            raise ValueError(f"Unknown event: {event}")
+        self.hooks[event].append(callback)
+
+    def emit(self, event, data):
+        for callback in self.hooks[event]:
+            callback(data)
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def record_match(self, result):
+        if self.matches == 0 and self.start_time is not None:
+            self.time_to_first_match = time.perf_counter() - self.start_time
+        self.matches += 1
+        if self.hooks["match"]:
+            self.emit("match", result)
+
+    def record_rejection(self, key):
+        self.predicate_rejections += 1
+        if self.hooks["predicate_rejection"]:
+            self.emit("predicate_rejection", key)
+
+    def sample(self, size1, size2):
+        sample = (self.tuples_read1 + self.tuples_read2, size1, size2)
+        self.hash_table_sizes.append(sample)
+        if self.hooks["sample"]:
+            self.emit("sample", sample)
+
+    def finish(self):
+        if self.start_time is not None:
+            self.total_time = time.perf_counter() - self.start_time
+        self.emit("finish", self)
+
+    def as_dict(self):
+        """
+        Get the metrics as a dictionary, e.g. to export them to a monitoring system.
+        """
+        return {
+            "tuples_read1": self.tuples_read1,
+            "tuples_read2": self.tuples_read2,
+            "probes": self.probes,
+            "key_hits": self.key_hits,
+            "predicate_rejections": self.predicate_rejections,
+            "matches": self.matches,
+            "hash_table_sizes": list(self.hash_table_sizes),
+            "parse_time": self.parse_time,
+            "probe_time": self.probe_time,
+            "output_time": self.output_time,
+            "time_to_first_match": self.time_to_first_match,
+            "total_time": self.total_time,
+        }
@@ -4,35 +4,22 @@ import logging
 from create_table import CreateTable
 from check_tables import CheckTables
 from semi_join import SemiJoin
+from bloom_semi_join import BloomSemiJoin
 from pipelined_hash_join import HashJoin
-from datetime import datetime
+from concurrent_source import DualSourceReader
+from incremental_join import IncrementalJoin
+from memory_usage import MemoryTracker
+from merge_join import MergeJoin
+from spilling_hash_join import SpillingHashJoin
+from window_hash_join import WindowHashJoin
+from numpy_join import NumpyJoin, np
+from planner import Planner
+from sqlite_join import SQLiteJoin
+from timestamp_filter import filter_tables
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 
-def filter_tables(table1, table2, timestamp_diff):
-    filtered_table1 = set()
-    filtered_table2 = set()
-
-    for row1 in table1:
-        timestamp1 = datetime.strptime(row1[3], "%Y-%m-%d %H:%M:%S")  # Access timestamp using index
-        for row2 in table2:
-            timestamp2 = datetime.strptime(row2[3], "%Y-%m-%d %H:%M:%S")  # Access timestamp using index
-            if abs((timestamp1 - timestamp2).total_seconds() / 3600) < timestamp_diff:
-                filtered_table1.add(tuple(row1))
-                break
-
-    for row2 in table2:
-        timestamp2 = datetime.strptime(row2[3], "%Y-%m-%d %H:%M:%S")  # Access timestamp using index
-        for row1 in table1:
-            timestamp1 = datetime.strptime(row1[3], "%Y-%m-%d %H:%M:%S")  # Access timestamp using index
-            if abs((timestamp2 - timestamp1).total_seconds() / 3600) < timestamp_diff:
-                filtered_table2.add(tuple(row2))
-                break
-
-    return filtered_table1, filtered_table2
-
-
 # Connect to the two databases
 conn1 = sqlite3.connect('databases/database1.db')
 conn2 = sqlite3.connect('databases/database2.db')
@@ -44,7 +31,7 @@ CreateTable(conn1, conn2).create_tables(size_table_1, size_table_2, seed=0)
 
 # Check tables
 check_tables = CheckTables(conn1, conn2)
-table1, table1_name, table2, table2_name = check_tables.check_tables()
+table1, table1_name, table2, table2_name = check_tables.load_tables()
 
 
 timestamp_diff = 6  # in hours
@@ -71,7 +58,118 @@ end_time = time.time()
 running_time = end_time - start_time
 
 logging.info(f"\nTotal matches (pipelined hash join lazy): {hash_join.counter}\n")
-logging.info(f"Running time (pipelined hash join lazy): {running_time} seconds\n")
+logging.info(f"Running time (pipelined hash join lazy): {running_time} seconds")
+logging.info(f"Peak hash table size (pipelined hash join lazy): {hash_join.peak_state_bytes / 1024 / 1024} MB")
+logging.info(f"Id matches rejected by the timestamp check (pipelined hash join lazy): "
+             f"{hash_join.metrics.predicate_rejections} of {hash_join.metrics.key_hits}\n")
+
+# Perform the pipelined hash join lazy on streamed input
+batch_size = 10
+stream1, _, stream2, _ = check_tables.stream_tables(batch_size)
+hash_join_stream = HashJoin(stream1, stream2, table1_name, table2_name, timestamp_diff, True)
+start_time = time.time()
+with MemoryTracker() as stream_tracker:
+    hash_join_stream.perform_pipelined_hash_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (pipelined hash join lazy, streamed): {hash_join_stream.counter}\n")
+logging.info(f"Running time (pipelined hash join lazy, streamed): {running_time} seconds")
+logging.info(f"Time to first result (pipelined hash join lazy, streamed): "
+             f"{hash_join_stream.time_to_first_result} seconds\n")
+
+# Perform the pipelined hash join lazy on streamed input keeping only ids and timestamps in the hash tables, the
+# rows of the matches being fetched back by id
+stream1, _, stream2, _ = check_tables.stream_tables(batch_size)
+hash_join_compact = HashJoin(stream1, stream2, table1_name, table2_name, timestamp_diff, True, compact=True,
+                             fetch=check_tables.row_fetchers())
+start_time = time.time()
+with MemoryTracker() as compact_tracker:
+    hash_join_compact.perform_pipelined_hash_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (pipelined hash join lazy, streamed, compact): {hash_join_compact.counter}\n")
+logging.info(f"Running time (pipelined hash join lazy, streamed, compact): {running_time} seconds")
+# Both peaks are measured by tracemalloc over the whole join, rows and hash tables alike
+logging.info(f"Peak memory traced (pipelined hash join lazy, streamed): {stream_tracker.peak_bytes / 1024 / 1024} MB")
+logging.info(f"Peak memory traced (pipelined hash join lazy, streamed, compact): "
+             f"{compact_tracker.peak_bytes / 1024 / 1024} MB\n")
+
+# Perform the pipelined hash join lazy with concurrent readers, the second source being artificially slow
+source = DualSourceReader('databases/database1.db', 'databases/database2.db', batch_size, latency2=0.01)
+hash_join_concurrent = HashJoin(None, None, source.table1_name, source.table2_name, timestamp_diff, True)
+start_time = time.time()
+hash_join_concurrent.perform_concurrent_hash_join(source)
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (pipelined hash join lazy, concurrent): {hash_join_concurrent.counter}\n")
+logging.info(f"Running time (pipelined hash join lazy, concurrent): {running_time} seconds")
+logging.info(f"Time waiting for the sources (pipelined hash join lazy, concurrent): {source.wait_time} seconds\n")
+
+# Perform the pipelined hash join lazy with a memory budget, spilling hash partitions to disk
+memory_budget = 10  # in tuples
+hash_join_spilling = SpillingHashJoin(table1, table2, table1_name, table2_name, timestamp_diff, True, memory_budget,
+                                      num_partitions=4)
+start_time = time.time()
+hash_join_spilling.perform_pipelined_hash_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (pipelined hash join lazy, spilling): {hash_join_spilling.counter}\n")
+logging.info(f"Running time (pipelined hash join lazy, spilling): {running_time} seconds")
+logging.info(f"Spilled (pipelined hash join lazy, spilling): {len(hash_join_spilling.spilled)} partitions, "
+             f"{hash_join_spilling.spilled_tuples} tuples, {hash_join_spilling.spilled_bytes} bytes\n")
+
+# Perform the pipelined hash join lazy evicting tuples that fell out of the time window
+allowed_lateness = 24  # in hours
+hash_join_window = WindowHashJoin(table1, table2, table1_name, table2_name, timestamp_diff, allowed_lateness)
+start_time = time.time()
+hash_join_window.perform_pipelined_hash_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (pipelined hash join lazy, window): {hash_join_window.counter}\n")
+logging.info(f"Running time (pipelined hash join lazy, window): {running_time} seconds")
+logging.info(f"Peak hash table entries (pipelined hash join lazy, window): {hash_join_window.peak_entries} "
+             f"instead of {hash_join.peak_entries}")
+logging.info(f"Evicted / late tuples (pipelined hash join lazy, window): {hash_join_window.expired_entries} / "
+             f"{hash_join_window.late_tuples}\n")
+
+# Perform the merge join lazy on the streams in id order
+stream1, _, stream2, _ = check_tables.stream_tables(batch_size, ordered=True)
+merge_join = MergeJoin(stream1, stream2, table1_name, table2_name, timestamp_diff, True)
+start_time = time.time()
+merge_join.perform_merge_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (merge join lazy): {merge_join.counter}\n")
+logging.info(f"Running time (merge join lazy): {running_time} seconds")
+logging.info(f"Peak size (merge join lazy): {merge_join.peak_state_bytes / 1024 / 1024} MB\n")
+
+# Perform the vectorized join lazy (only if NumPy is installed)
+if np is not None:
+    numpy_join = NumpyJoin(table1, table2, table1_name, table2_name, timestamp_diff, True)
+    start_time = time.time()
+    numpy_join.perform_join()
+    end_time = time.time()
+    running_time = end_time - start_time
+
+    logging.info(f"\nTotal matches (NumPy join lazy): {numpy_join.counter}\n")
+    logging.info(f"Running time (NumPy join lazy): {running_time} seconds\n")
+
+# Perform the join lazy pushed down to SQLite
+sqlite_join = SQLiteJoin('databases/database1.db', 'databases/database2.db', timestamp_diff, True)
+start_time = time.time()
+sqlite_join.perform_join()
+end_time = time.time()
+running_time = end_time - start_time
+sqlite_join.close()
+
+logging.info(f"\nTotal matches (SQLite join lazy): {sqlite_join.counter}\n")
+logging.info(f"Running time (SQLite join lazy): {running_time} seconds\n")
 
 ################################ semi join ######################################
 
@@ -108,6 +206,74 @@ logging.info(f"\nTotal matches (semi-join lazy): {semi_join_lazy.counter}\n")
 logging.info(f"Running time (semi-join lazy): {running_time} seconds")
 logging.info(f"Total size used (semi-join lazy): {size_used} MB")
 
+# Perform the semi-join with a Bloom filter over (id, hour bucket) pairs of S
+semi_join_bloom = BloomSemiJoin(table1, table2, table1_name, table2_name, timestamp_diff, 0.01, True)
+start_time = time.time()
+_, size_used = semi_join_bloom.perform_semi_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (semi-join Bloom): {semi_join_bloom.counter}\n")
+logging.info(f"Running time (semi-join Bloom): {running_time} seconds")
+logging.info(f"False-positive rate (semi-join Bloom): {semi_join_bloom.false_positive_rate}")
+logging.info(f"Filter size (semi-join Bloom): {semi_join_bloom.filter_bytes} bytes "
+             f"(S_lookup: {semi_join_bloom.lookup_bytes} bytes)")
+logging.info(f"Data shipped (semi-join Bloom): {semi_join_bloom.transfer_bytes} bytes")
+
+# Perform the semi-join lazy with a merge of the streams in id order
+# S is the largest table, as for the other semi-joins (the streams do not know their length)
+S_name = table1_name if len(table1) >= len(table2) else table2_name
+stream1, _, stream2, _ = check_tables.stream_tables(batch_size, ordered=True)
+semi_join_merge = MergeJoin(stream1, stream2, table1_name, table2_name, timestamp_diff, True, S_name)
+start_time = time.time()
+_, size_used = semi_join_merge.perform_semi_join()
+end_time = time.time()
+running_time = end_time - start_time
+
+logging.info(f"\nTotal matches (semi-join merge): {semi_join_merge.counter}\n")
+logging.info(f"Running time (semi-join merge): {running_time} seconds")
+logging.info(f"Total size used (semi-join merge): {size_used} MB")
+
+
+############################ incremental join #################################
+
+# Join the tables incrementally: the first run joins every row, the next one only the appended rows
+incremental_join = IncrementalJoin('databases/database1.db', 'databases/database2.db', 'databases/join_state.db',
+                                   timestamp_diff)
+incremental_join.perform_incremental_join()
+logging.info(f"\nTotal matches (incremental join, first run): {incremental_join.counter}\n")
+
+create_table = CreateTable(conn1, conn2)
+create_table.append_rows(conn1, conn1.cursor(), table1_name, 5, seed=0)
+create_table.append_rows(conn2, conn2.cursor(), table2_name, 5, seed=100)
+
+start_time = time.time()
+incremental_join.perform_incremental_join()
+end_time = time.time()
+running_time = end_time - start_time
+incremental_join.close()
+
+logging.info(f"\nNew matches (incremental join, after appending 5 rows to each table): {incremental_join.counter}\n")
+logging.info(f"Running time (incremental join): {running_time} seconds, "
+             f"{incremental_join.delta1} + {incremental_join.delta2} new rows joined\n")
+
+
+############################ planner #################################
+
+# Let the planner choose the semi-join strategy from the statistics of the databases and run it
+planner = Planner('databases/database1.db', 'databases/database2.db', timestamp_diff)
+logging.info(f"\n{planner.explain('semi_join')}")
+semi_join_planned = planner.create_join('semi_join')
+start_time = time.time()
+_, size_used = planner.run_join(semi_join_planned, 'semi_join')
+end_time = time.time()
+running_time = end_time - start_time
+planner.close()
+
+logging.info(f"\nTotal matches (semi-join planned): {semi_join_planned.counter}\n")
+logging.info(f"Running time (semi-join planned): {running_time} seconds")
+logging.info(f"Total size used (semi-join planned): {size_used} MB")
+
 
 # Close the database connections
 conn1.close()
@@ -0,0 +1,130 @@
+import sys
+import tracemalloc
+from array import array
+from collections import deque
+from itertools import islice
+
+
+CONTAINERS = (list, tuple, set, frozenset, deque)
+LEAVES = (str, bytes, bytearray, int, float, bool, complex, type(None), array)
+SAMPLE_SIZE = 1000  # Items measured by sampled_sizeof per container
+
+
+def deep_sizeof(*objects):
+    """
+    Estimate the memory held by objects, including everything they reference.
+
+    Unlike sys.getsizeof, which only measures the container itself, this follows the items of lists, tuples,
+    sets and dicts and the attributes of plain objects. Objects referenced several times are counted once.
+
+    :param objects: The objects to measure
+    :return: The size in bytes
+    """
+    seen = set()
+    stack = list(objects)
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, LEAVES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, CONTAINERS):
+            stack.extend(obj)
+        elif not callable(obj):
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+def sizeof_without_rows(*objects):
+    """
+    Estimate the memory held by objects that reference rows owned by their table, leaving the rows out.
+
+    A tuple, e.g. a (row, epoch) entry of a hash table or an (id, record1, record2) result, is counted with its
+    items except the tuples (the rows) among them. Other objects are measured with deep_sizeof.
+
+    :param objects: The objects to measure
+    :return: The size in bytes
+    """
+    size = 0
+    for obj in objects:
+        if isinstance(obj, tuple):
+            size += sys.getsizeof(obj) + deep_sizeof(*(item for item in obj if not isinstance(item, tuple)))
+        else:
+            size += deep_sizeof(obj)
+    return size
+
+
+def sampled_sizeof(*objects, sample_size=SAMPLE_SIZE, sizeof=deep_sizeof):
+    """
+    Estimate sizeof(*objects) in a time and memory bounded by the sample size.
+
+    The items of a dict, list, tuple, set or deque are measured one by one on the first sample_size of them and
+    their average is scaled to the length of the container. Other objects, e.g. a CompactHashTable or a NumPy
+    array, are measured with deep_sizeof. Objects shared by several items are counted once per item.
+
+    :param objects: The objects to measure
+    :param sample_size: Number of items measured per container
+    :param sizeof: Function measuring an item (called with the key and the value for a dict), e.g.
+                   sizeof_without_rows for containers whose rows are owned by their table
+    :return: The estimated size in bytes
+    """
+    size = 0
+    for obj in objects:
+        if isinstance(obj, dict):
+            items = obj.items()
+        elif isinstance(obj, CONTAINERS):
+            items = ((item,) for item in obj)
+        else:
+            size += deep_sizeof(obj)
+            continue
+
+        sampled = 0
+        sample_bytes = 0
+        for item in islice(items, sample_size):
+            sample_bytes += sizeof(*item)
+            sampled += 1
+        size += sys.getsizeof(obj)
+        if sampled:
+            size += sample_bytes * len(obj) // sampled
+    return size
+
+
+def to_mb(size):
+    return size / 1024 / 1024
+
+
+class MemoryTracker:
+    def __init__(self):
+        """
+        Initialize the MemoryTracker object, a context manager measuring the peak memory allocated by Python while
+        it is active (with tracemalloc).
+        """
+        self.was_tracing = False
+        self.baseline = 0
+        self.peak_bytes = 0
+
+    def __enter__(self):
+        self.was_tracing = tracemalloc.is_tracing()
+        if not self.was_tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.peak_bytes = tracemalloc.get_traced_memory()[1] - self.baseline
+        if not self.was_tracing:
+            tracemalloc.stop()
+        return False
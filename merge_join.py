@@ -0,0 +1,187 @@
+import logging
+from columnar_table import to_epoch
+from join_metrics import JoinMetrics
+from memory_usage import deep_sizeof, sampled_sizeof, to_mb
+from result_sinks import LoggingSink
+
+
+class MergeJoin:
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, S_name=None, metrics=None,
+                 sink=None):
+        """
+        Initialize the MergeJoin object.
+
+        A sort-merge join of two inputs ordered by id, e.g. the streams of CheckTables.stream_tables with
+        ordered=True, which SQLite returns in primary-key order at no cost. Both inputs are walked in lockstep and
+        only the rows of the current id are held, so the memory does not grow with the tables, and an input is not
+        read any further once the other one is exhausted.
+
+        :param table1: The first table, an iterable of rows ordered by id
+        :param table2: The second table, as table1
+        :param table1_name: The name of the first table
+        :param table2_name: The name of the second table
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param lazy: A flag indicating lazy evaluation (timestamps are checked during the join); if False, the
+                     inputs are expected to be filtered on their timestamps already (FTTJ)
+        :param S_name: For the semi-join, the name of the table to use as S. If None, the largest table is used
+                       when the tables have a length, table1 otherwise.
+        :param metrics: JoinMetrics object collecting what the join does (a new one if None)
+        :param sink: ResultSink the join results are handed to (a LoggingSink if None)
+        """
+        self.table1 = table1
+        self.table2 = table2
+        self.table1_name = table1_name
+        self.table2_name = table2_name
+        self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.lazy = lazy
+        self.S_name = S_name
+        self.counter = 0  # Initialize counter for counting the matching records
+        self.peak_rows = {1: 0, 2: 0}  # Largest number of rows of one id held per input
+        self.row_bytes = 0  # Deep size of a row, measured on the last row read
+        self.peak_state_bytes = 0  # Memory of the rows held at once (and of R1 for the semi-join)
+        self.metrics = metrics if metrics is not None else JoinMetrics()
+        self.logger = logging.getLogger("MergeJoin")
+        self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger, "Matching records => ")
+
+    def iter_groups(self, table, side):
+        """
+        Group the rows of an input ordered by id.
+
+        :param table: The input
+        :param side: 1 or 2, the input the rows are counted for
+        :return: Iterator of (id, rows) pairs
+        """
+        key = None
+        group = []
+        for row in table:
+            if row[0] == key:
+                group.append(row)
+                continue
+            if group:
+                self.end_group(side, group)
+                yield key, group
+                if row[0] < key:
+                    raise ValueError(f"The rows of input {side} are not ordered by id: {row[0]} follows {key}")
+            key = row[0]
+            group = [row]
+        if group:
+            self.end_group(side, group)
+            yield key, group
+
+    def end_group(self, side, group):
+        if side == 1:
+            self.metrics.tuples_read1 += len(group)
+        else:
+            self.metrics.tuples_read2 += len(group)
+        if len(group) > self.peak_rows[side]:
+            self.peak_rows[side] = len(group)
+            self.row_bytes = deep_sizeof(group[-1])
+
+    def merge(self, table1, table2, sides=(1, 2)):
+        """
+        Walk two inputs ordered by id in lockstep.
+
+        :param sides: Which input of the join (1 or 2) table1 and table2 are, for the metrics
+        :return: Iterator of (id, rows1, rows2) for the ids present in both inputs
+        """
+        groups1 = self.iter_groups(table1, sides[0])
+        groups2 = self.iter_groups(table2, sides[1])
+        group1 = next(groups1, None)
+        group2 = next(groups2, None)
+        metrics = self.metrics
+
+        try:
+            while group1 is not None and group2 is not None:
+                metrics.probes += 1
+                if group1[0] < group2[0]:
+                    group1 = next(groups1, None)
+                elif group1[0] > group2[0]:
+                    group2 = next(groups2, None)
+                else:
+                    metrics.key_hits += 1
+                    yield group1[0], group1[1], group2[1]
+                    group1 = next(groups1, None)
+                    group2 = next(groups2, None)
+        finally:
+            # Close a stream left unfinished, so that its cursor does not keep the database locked
+            for table in (table1, table2):
+                if hasattr(table, "close"):
+                    table.close()
+
+    def within_window(self, record1, record2):
+        return abs(to_epoch(record1[3]) - to_epoch(record2[3])) < self.window
+
+    def perform_merge_join(self):
+        """
+        Perform the merge join. The timestamps are only parsed for the rows whose id matches.
+
+        The join results (id, record1, record2) are handed to the sink.
+        """
+        self.logger.info("\n============================== Merge Join ==============================")
+        self.metrics.start()
+
+        for key, rows1, rows2 in self.merge(self.table1, self.table2):
+            for record1 in rows1:
+                for record2 in rows2:
+                    if not self.lazy or self.within_window(record1, record2):
+                        self.process_join_result((key, record1, record2))
+                    else:
+                        self.metrics.record_rejection(key)
+
+        self.sink.flush()
+        self.peak_state_bytes = (self.peak_rows[1] + self.peak_rows[2]) * self.row_bytes
+        self.metrics.sample(self.peak_rows[1], self.peak_rows[2])
+        self.metrics.finish()
+
+    def process_join_result(self, result):
+        self.sink.write(result)
+        self.counter += 1
+        self.metrics.record_match(result)
+
+    def get_roles(self):
+        """
+        Determine which table plays S and which plays R.
+
+        :return: The tables S and R, and the sides (see merge) of R and S.
+        """
+        S_name = self.S_name
+        if S_name is None:
+            if hasattr(self.table1, "__len__") and hasattr(self.table2, "__len__"):
+                S_name = self.table1_name if len(self.table1) >= len(self.table2) else self.table2_name
+            else:
+                S_name = self.table1_name
+        self.logger.info(f"S = {S_name}")
+        if S_name == self.table1_name:
+            return self.table1, self.table2, (2, 1)
+        return self.table2, self.table1, (1, 2)
+
+    def perform_semi_join(self):
+        """
+        Perform the semi-join R1 = R semi-join S with a merge: a row of R is kept if a row of S with the same id
+        lies within the timestamp window (or, if not lazy, just exists).
+
+        Returns:
+        - R1: The result of the semi-join operation.
+        - size_used: The memory size (in MB) used by the result and the rows held at once.
+        """
+        self.logger.info("\n============================== Merge Semi Join ==============================")
+        S, R, sides = self.get_roles()
+        self.metrics.start()
+
+        R1 = []
+        for key, rows_R, rows_S in self.merge(R, S, sides):
+            for row in rows_R:
+                if not self.lazy or any(self.within_window(row, row_S) for row_S in rows_S):
+                    R1.append(row)
+                    self.process_join_result(row)
+                else:
+                    self.metrics.record_rejection(key)
+
+        self.sink.flush()
+        self.peak_state_bytes = (self.peak_rows[1] + self.peak_rows[2]) * self.row_bytes + sampled_sizeof(R1)
+        self.metrics.sample(self.peak_rows[1], self.peak_rows[2])
+        self.metrics.finish()
+
+        return R1, to_mb(self.peak_state_bytes)
@@ -0,0 +1,123 @@
+import logging
+import sys
+from columnar_table import id_column, epoch_column
+from memory_usage import sampled_sizeof, sizeof_without_rows, to_mb
+from result_sinks import LoggingSink
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only this engine needs it
+    np = None
+
+
+class NumpyJoin:
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, sink=None, S_name=None):
+        """
+        Initialize the NumpyJoin object.
+
+        A batch (non-pipelined) join engine that evaluates the id equality and the timestamp window on NumPy
+        arrays instead of row by row, and only materialises the matching rows.
+
+        :param table1: The first table (a list of rows or a ColumnarTable)
+        :param table2: The second table (a list of rows or a ColumnarTable)
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param lazy: A flag indicating lazy evaluation (timestamps are checked during the join); if False, the
+                     tables are expected to be filtered on their timestamps already (FTTJ)
+        :param sink: ResultSink the results are handed to (a LoggingSink if None)
+        :param S_name: For the semi-join, the name of the table to use as S. If None, the largest table is used.
+        """
+        if np is None:
+            raise ImportError("NumpyJoin requires NumPy (pip install numpy)")
+        self.table1 = table1
+        self.table2 = table2
+        self.table1_name = table1_name
+        self.table2_name = table2_name
+        self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.lazy = lazy
+        self.S_name = S_name
+        self.counter = 0  # Initialize counter for counting the matching records
+        self.peak_state_bytes = 0  # Memory of the index arrays and the materialised results, without the rows
+        self.logger = logging.getLogger("NumpyJoin")
+        self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger)
+
+    @staticmethod
+    def columns(table):
+        """
+        Get the id and timestamp columns of a table as int64 arrays (without copying for a ColumnarTable).
+        """
+        ids = np.frombuffer(id_column(table), dtype=np.int64)
+        epochs = np.frombuffer(epoch_column(table), dtype=np.int64)
+        return ids, epochs
+
+    def match_indices(self, table1, table2, lazy):
+        """
+        Compute the row indices of the matching pairs.
+
+        The ids are primary keys, so they are unique within each table and intersect1d can return the position of
+        every common id in both tables.
+
+        :return: Two arrays with the indices of the matching rows in table1 and table2
+        """
+        ids1, epochs1 = self.columns(table1)
+        ids2, epochs2 = self.columns(table2)
+        _, indices1, indices2 = np.intersect1d(ids1, ids2, assume_unique=True, return_indices=True)
+
+        if lazy:
+            within = np.abs(epochs1[indices1] - epochs2[indices2]) < self.window
+            indices1 = indices1[within]
+            indices2 = indices2[within]
+
+        return indices1, indices2
+
+    def perform_join(self):
+        """
+        Perform the join and return the matching records as (id, record1, record2) triples, like HashJoin.
+
+        :return: The join results
+        """
+        self.logger.info("\n============================== NumPy Join ==============================")
+
+        indices1, indices2 = self.match_indices(self.table1, self.table2, self.lazy)
+        results = [(self.table1[i][0], self.table1[i], self.table2[j])
+                   for i, j in zip(indices1.tolist(), indices2.tolist())]
+        for triple in results:
+            self.sink.write(triple)
+        self.sink.flush()
+        self.counter = len(results)
+        self.peak_state_bytes = sampled_sizeof(results, sizeof=sizeof_without_rows) + sampled_sizeof(indices1, indices2)
+
+        return results
+
+    def perform_semi_join(self):
+        """
+        Perform the semi-join R semi-join S, like SemiJoin, where S is the largest table unless S_name is given.
+
+        Returns:
+        - R1: The result of the semi-join operation.
+        - size_used: The memory size (in MB) used by the result and the index arrays.
+        """
+        self.logger.info("\n============================== NumPy Semi Join ==============================")
+
+        if self.S_name is not None:
+            S_is_table1 = self.S_name == self.table1_name
+        else:
+            S_is_table1 = len(self.table1) >= len(self.table2)
+        if S_is_table1:
+            S, R = self.table1, self.table2
+        else:
+            S, R = self.table2, self.table1
+
+        indices_R, _ = self.match_indices(R, S, self.lazy)
+        indices_R.sort()
+        R1 = [R[i] for i in indices_R.tolist()]
+        for row in R1:
+            self.sink.write(row)
+        self.sink.flush()
+        self.counter = len(R1)
+
+        self.peak_state_bytes = sys.getsizeof(R1) + sampled_sizeof(indices_R)
+        size_used = to_mb(self.peak_state_bytes)
+
+        return R1, size_used
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from check_tables import CheckTables
+from columnar_table import ColumnarTable, to_epoch
+from pipelined_hash_join import HashJoin
+from result_sinks import CountSink, ListSink
+from semi_join import SemiJoin
+from timestamp_filter import has_neighbour
+
+
+def read_partition(database, table_name, low, high):
+    """
+    Read the rows of a table whose id lies in [low, high).
+
+    :return: The rows of the partition as a ColumnarTable
+    """
+    conn = sqlite3.connect(database)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {table_name} WHERE id >= ? AND id < ?", (low, high))
+        return ColumnarTable(cursor.fetchall())
+    finally:
+        conn.close()
+
+
+def filter_partition(table, other_epochs, window):
+    """
+    Keep the rows of a partition that have a timestamp of the other (whole) table within the window.
+
+    :param table: The partition as a ColumnarTable
+    :param other_epochs: Sorted timestamps of the other table in epoch seconds
+    :param window: Maximum timestamp difference in seconds
+    :return: The filtered rows
+    """
+    return [row for row, epoch in zip(table.rows, table.timestamps) if has_neighbour(other_epochs, epoch, window)]
+
+
+def join_partition(task):
+    """
+    Join one id range of both tables. This runs in a worker process.
+
+    :param task: Tuple (join, low, high) where join is the ParallelJoin object describing the run
+    :return: Tuple (counter, results, peak_state_bytes) of the partition
+    """
+    join, low, high = task
+    table1 = read_partition(join.database1, join.table1_name, low, high)
+    table2 = read_partition(join.database2, join.table2_name, low, high)
+
+    fttj = not join.lazy and not join.eager
+    if fttj:
+        window = join.timestamp_diff * 3600
+        table1 = filter_partition(table1, join.epochs2, window)
+        table2 = filter_partition(table2, join.epochs1, window)
+
+    if join.operator == "hash_join":
+        sink = ListSink() if join.ship_results else CountSink()
+        hash_join = HashJoin(table1, table2, join.table1_name, join.table2_name, join.timestamp_diff, join.lazy,
+                             sink=sink)
+        hash_join.perform_pipelined_hash_join()
+        return hash_join.counter, sink.results if join.ship_results else [], hash_join.peak_state_bytes
+
+    semi_join = SemiJoin(table1, table2, join.table1_name, join.table2_name, join.timestamp_diff, join.lazy,
+                         join.eager, S_name=join.S_name, sink=CountSink())
+    R1, _ = semi_join.perform_semi_join()
+    return semi_join.counter, R1 if join.ship_results else [], semi_join.peak_state_bytes
+
+
+class ParallelJoin:
+    def __init__(self, database1, database2, timestamp_diff, operator, lazy, eager=False, workers=None,
+                 num_partitions=None, sink=None):
+        """
+        Initialize the ParallelJoin object.
+
+        Both tables are partitioned on the join key into id ranges, and every partition is joined independently
+        in a process pool. Each worker reads its own id range from the database files, so the tables are never
+        pickled across processes.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param operator: "hash_join" or "semi_join"
+        :param lazy: A flag indicating lazy evaluation
+        :param eager: A flag indicating eager evaluation (semi-join only); FTTJ is used if neither flag is set
+        :param workers: The number of worker processes (the number of CPUs if None)
+        :param num_partitions: The number of id ranges (the number of workers if None)
+        :param sink: ResultSink the results of the partitions are handed to in this process; if None, they are
+                     merged into the results list. With a CountSink the workers only count their results and
+                     send no rows back.
+        """
+        if operator not in ("hash_join", "semi_join"):
+            raise ValueError(f"Unknown operator: {operator}")
+        self.database1 = database1
+        self.database2 = database2
+        self.timestamp_diff = timestamp_diff
+        self.operator = operator
+        self.lazy = lazy
+        self.eager = eager
+        self.workers = workers
+        self.num_partitions = num_partitions
+        self.table1_name = None
+        self.table2_name = None
+        self.S_name = None
+        self.epochs1 = None
+        self.epochs2 = None
+        self.sink = sink
+        self.ship_results = not isinstance(sink, CountSink)  # Whether the workers send their result rows back
+        self.counter = 0
+        self.results = []
+        self.peak_state_bytes = 0  # Sum of the peaks of the partitions (an upper bound, the workers run at the same time)
+
+    def __getstate__(self):
+        # Workers only need the run description, not the sink and the merged results
+        state = self.__dict__.copy()
+        state["sink"] = None
+        state["results"] = []
+        return state
+
+    def prepare(self):
+        """
+        Read the table names, the id ranges and the statistics the workers share.
+
+        :return: List of (low, high) id ranges
+        """
+        conn1 = sqlite3.connect(self.database1)
+        conn2 = sqlite3.connect(self.database2)
+        try:
+            cursor1 = conn1.cursor()
+            cursor2 = conn2.cursor()
+            self.table1_name = CheckTables.get_table_name(cursor1)
+            self.table2_name = CheckTables.get_table_name(cursor2)
+
+            cursor1.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM {self.table1_name}")
+            count1, min1, max1 = cursor1.fetchone()
+            cursor2.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM {self.table2_name}")
+            count2, min2, max2 = cursor2.fetchone()
+
+            # S is chosen on the whole tables, so that every partition uses the same roles
+            self.S_name = self.table1_name if count1 >= count2 else self.table2_name
+
+            # FTTJ compares every row with all timestamps of the other table, not only those of its partition
+            if not self.lazy and not self.eager:
+                cursor1.execute(f"SELECT timestamp FROM {self.table1_name}")
+                self.epochs1 = array('q', sorted(to_epoch(row[0]) for row in cursor1))
+                cursor2.execute(f"SELECT timestamp FROM {self.table2_name}")
+                self.epochs2 = array('q', sorted(to_epoch(row[0]) for row in cursor2))
+        finally:
+            conn1.close()
+            conn2.close()
+
+        if count1 == 0 or count2 == 0:
+            return []
+
+        # Only ids present in both tables can match
+        low = max(min1, min2)
+        high = min(max1, max2) + 1
+        if low >= high:
+            return []
+
+        num_partitions = self.num_partitions or self.workers or os.cpu_count() or 1
+        step = -(-(high - low) // num_partitions)  # Ceiling division
+        return [(start, min(start + step, high)) for start in range(low, high, step)]
+
+    def perform_parallel_join(self):
+        """
+        Run the join on all partitions in a process pool and merge the counters and results.
+
+        :return: The merged results (empty if a sink was given)
+        """
+        ranges = self.prepare()
+
+        self.counter = 0
+        self.results = []
+        self.peak_state_bytes = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for counter, results, peak_state_bytes in executor.map(join_partition,
+                                                                   [(self, low, high) for low, high in ranges]):
+                self.counter += counter
+                if self.sink is None:
+                    self.results.extend(results)
+                elif not self.ship_results:
+                    self.sink.count += counter
+                else:
+                    for result in results:
+                        self.sink.write(result)
+                self.peak_state_bytes += peak_state_bytes
+
+        if self.sink is not None:
+            self.sink.flush()
+        return self.results
@@ -1,50 +1,114 @@
 import logging
-from datetime import datetime
+import time
+from columnar_table import iter_with_epochs, to_epoch
+from compact_hash_table import CompactHashTable
+from join_metrics import JoinMetrics
+from memory_usage import deep_sizeof, sampled_sizeof, sizeof_without_rows
+from result_sinks import LoggingSink
+
+
+def row_id(row):
+    return row[0]
 
 
 class HashJoin:
-    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy):
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, metrics=None, sink=None,
+                 compact=False, fetch=None):
+        """
+        Initialize the HashJoin object.
+
+        :param table1: The first table (a list of rows, a ColumnarTable or a streaming iterator of rows), or None
+                       when the input is passed to perform_concurrent_hash_join
+        :param table2: The second table, as table1
+        :param table1_name: The name of the first table
+        :param table2_name: The name of the second table
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param lazy: A flag indicating lazy evaluation (timestamps are checked during the join)
+        :param metrics: JoinMetrics object collecting what the join does (a new one if None)
+        :param sink: ResultSink the join results are handed to (a LoggingSink if None)
+        :param compact: Keep only the ids and timestamps in the hash tables (CompactHashTable) and fetch the row of
+                        a tuple by its id with fetch when it matches, so that the rows are not kept in memory; works
+                        with every kind of table, including streams
+        :param fetch: With compact, the functions (fetch1, fetch2) returning a row of table1 and table2 by its id,
+                      e.g. CheckTables.row_fetchers()
+        """
         self.table1 = table1
         self.table2 = table2
         self.table1_name = table1_name
         self.table2_name = table2_name
         self.timestamp_diff = timestamp_diff
         self.lazy = lazy
-        self.ht1 = {}  # Initialize empty hash table for table1
-        self.ht2 = {}  # Initialize empty hash table for table2
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.compact = compact
+        if compact:
+            if fetch is None:
+                raise ValueError("compact hash tables need the functions fetching the rows of the tables by id")
+            # The id is the INTEGER PRIMARY KEY, so the rowid a row is fetched back by
+            self.ht1 = CompactHashTable(fetch[0], reference=row_id)
+            self.ht2 = CompactHashTable(fetch[1], reference=row_id)
+        else:
+            self.ht1 = {}  # Initialize empty hash table for table1
+            self.ht2 = {}  # Initialize empty hash table for table2
         self.counter = 0  # Initialize counter for counting the matching records
+        self.start_time = None  # Time the join started
+        self.time_to_first_result = None  # Seconds from the start of the join to the first match
+        self.peak_entries = 0  # Largest number of tuples held in ht1 and ht2 together
+        self.evicted_entries = 0  # Tuples removed from the hash tables (spilled or expired)
+        self.evicted_bytes = 0  # Size of the removed entries, used to estimate the size of an entry
+        # Estimated peak memory of the hash tables. The rows are only included when the join owns them, i.e. when
+        # they are read from a stream; the rows of a list or a ColumnarTable are held by the table anyway.
+        self.peak_state_bytes = 0
+        self.owns_rows = {1: not hasattr(table1, "__getitem__"), 2: not hasattr(table2, "__getitem__")}
+        self.metrics = metrics if metrics is not None else JoinMetrics()
         self.logger = logging.getLogger("PipelinedHashJoin")
         self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger, "Matching records => ")
 
-    def probe_and_insert(self, tuple_, ht_probe, ht_insert):
+    def probe_and_insert(self, tuple_, epoch, ht_probe, ht_insert):
         """
         Perform probing and insertion in the hash tables.
 
         :param tuple_: Tuple representing a record from one of the databases
+        :param epoch: Timestamp of the tuple in epoch seconds (None if not lazy)
         :param ht_probe: Hash table for probing
-        :param ht_insert: Hash table for insertion
+        :param ht_insert: Hash table for insertion (None to only probe)
         :return: Result set if a match is found within the specified timestamp difference if lazy evaluation
         """
         probe_result_key = tuple_[0]  # Define the key of the tuple (join attribute)
         result_set = None
 
+        self.metrics.probes += 1
         if probe_result_key in ht_probe:
-            # Retrieve matching records from both databases using the probe result key
-            record1 = ht_probe[probe_result_key]
+            self.metrics.key_hits += 1
+
+            # Retrieve matching records from both databases using the probe result key; a compact hash table only
+            # fetches the row once the timestamps match
+            if self.compact:
+                record1, epoch1 = None, ht_probe.get_epoch(probe_result_key)
+            else:
+                record1, epoch1 = ht_probe[probe_result_key]
             record2 = tuple_
 
             # Lazy
             if self.lazy:
                 # Check if the timestamp difference is less than a specified hour limit
-                time_diff = (abs(datetime.strptime(record1[3], "%Y-%m-%d %H:%M:%S") -
-                                    datetime.strptime(record2[3], "%Y-%m-%d %H:%M:%S"))).total_seconds() / 3600
-                if time_diff < self.timestamp_diff:
+                if abs(epoch1 - epoch) < self.window:
                     result_set = (probe_result_key, record1, record2)
+                else:
+                    self.metrics.record_rejection(probe_result_key)
 
             else:  # Check only id -  timestamps are filtered before join
                 result_set = (probe_result_key, record1, record2)
 
-        ht_insert[probe_result_key] = tuple_  # Insert the tuple into the insertion hash table
+            if result_set is not None and self.compact:
+                result_set = (probe_result_key, ht_probe[probe_result_key][0], record2)
+
+        if ht_insert is not None:
+            ht_insert[probe_result_key] = (tuple_, epoch)  # Insert the tuple into the insertion hash table
+
+        entries = len(self.ht1) + len(self.ht2)
+        if entries > self.peak_entries:
+            self.peak_entries = entries
 
         return result_set
 
@@ -52,60 +116,189 @@ class HashJoin:
         """
         Perform the double pipelined hash join algorithm.
 
-        It iterates over the tuples from both lists, performs probing and insertion in the hash tables, and prints
-        the join results.
+        It iterates over the tuples from both inputs, performs probing and insertion in the hash tables, and hands
+        the join results to the sink.
 
         The method follows the pipelined hash join algorithm, which involves alternating between reading tuples from
-        the lists, probing one hash table, and inserting tuples into the other hash table.
+        the inputs, probing one hash table, and inserting tuples into the other hash table.
 
-        The join results are printed using the process_join_result method.
+        The join results are processed using the process_join_result method.
         """
 
-        read_index_table1 = 0  # Index for reading from table1
-        read_index_table2 = 0  # Index for reading from table2
+        # Timestamps are only compared in lazy mode, so they are only parsed there
+        source1 = iter_with_epochs(self.table1, self.lazy)
+        source2 = iter_with_epochs(self.table2, self.lazy)
+        exhausted1 = False
+        exhausted2 = False
 
         self.logger.info("\n============================== Pipelined Hash Join ==============================")
 
+        self.start_time = time.perf_counter()
+        self.metrics.start()
+
         # Iterate over the tuples from both tables and perform the pipelined hash join operation
-        while True:
-            if read_index_table1 < len(self.table1):
-                # Read a tuple from table1 at the current read index
-                tuple_ = self.table1[read_index_table1]
+        while not (exhausted1 and exhausted2):
+            if not exhausted1:
+                # Read the next tuple from table1
+                item = self.read_next(source1)
+                if item is None:
+                    exhausted1 = True
+                    self.input_exhausted(1)
+                else:
+                    tuple_, epoch = item
+                    self.metrics.tuples_read1 += 1
+
+                    # Perform probing and insertion by using table2 as the probe hash table
+                    # and table1 as the insert hash table, and process the join result
+                    self.process_tuple(tuple_, epoch, self.ht2, self.ht1, self.table2_name, self.table1_name)
+
+            if not exhausted2:
+                # Read the next tuple from table2
+                item = self.read_next(source2)
+                if item is None:
+                    exhausted2 = True
+                    self.input_exhausted(2)
+                else:
+                    tuple_, epoch = item
+                    self.metrics.tuples_read2 += 1
+
+                    # Perform probing and insertion by using table1 as the probe hash table
+                    # and table2 as the insert hash table, and process the join result
+                    self.process_tuple(tuple_, epoch, self.ht1, self.ht2, self.table1_name, self.table2_name)
+
+        self.finish_join()
+
+    def perform_concurrent_hash_join(self, source):
+        """
+        Perform the double pipelined hash join on batches produced concurrently by both inputs.
+
+        Unlike perform_pipelined_hash_join, which strictly alternates between the two tables, this method
+        consumes whichever input has data ready, so a stalled source does not stall the join as long as the
+        other one still produces tuples.
+
+        :param source: Iterable of (side, batch) pairs, e.g. a DualSourceReader, where side 1 is table1; an empty
+                       batch marks the end of a side
+        """
+        self.logger.info("\n========================= Concurrent Pipelined Hash Join =========================")
+
+        self.start_time = time.perf_counter()
+        self.metrics.start()
+        metrics = self.metrics
 
-                # Perform probing and insertion by using table2 as the probe hash table
-                # and table1 as the insert hash table
-                result = self.probe_and_insert(tuple_, self.ht2, self.ht1)
+        for side, batch in source:
+            if not batch:
+                self.input_exhausted(side)
+                continue
+            if side == 1:
+                ht_probe, ht_insert, probe, insert = self.ht2, self.ht1, self.table2_name, self.table1_name
+            else:
+                ht_probe, ht_insert, probe, insert = self.ht1, self.ht2, self.table1_name, self.table2_name
 
-                # Process the join result
-                self.process_join_result(result, self.table2_name, self.table1_name)
+            if self.lazy:
+                parse_start = time.perf_counter() if metrics.timing else 0
+                epochs = [to_epoch(tuple_[3]) for tuple_ in batch]
+                if metrics.timing:
+                    metrics.parse_time += time.perf_counter() - parse_start
+            else:
+                epochs = [None] * len(batch)
+
+            # Count the tuples one by one, so that the hash table sizes are sampled every sample_interval tuples
+            for tuple_, epoch in zip(batch, epochs):
+                if side == 1:
+                    metrics.tuples_read1 += 1
+                else:
+                    metrics.tuples_read2 += 1
+                self.process_tuple(tuple_, epoch, ht_probe, ht_insert, probe, insert)
 
-                # Increment the read index for table1
-                read_index_table1 += 1
+        self.finish_join()
 
-            if read_index_table2 < len(self.table2):
-                # Read a tuple from table2 at the current read index
-                tuple_ = self.table2[read_index_table2]
+    def input_exhausted(self, side):
+        """
+        Called once an input is exhausted. Both hash tables are kept until the end of the join.
+
+        :param side: 1 or 2, the input
+        """
 
-                # Perform probing and insertion by using table1 as the probe hash table
-                # and table2 as the insert hash table
-                result = self.probe_and_insert(tuple_, self.ht1, self.ht2)
+    def read_next(self, source):
+        """
+        Read the next (tuple, epoch) pair from an input, measuring the time spent reading and parsing.
 
-                # Process the join result
-                self.process_join_result(result, self.table1_name, self.table2_name)
+        :return: The next pair, or None if the input is exhausted
+        """
+        if not self.metrics.timing:
+            return next(source, None)
+        parse_start = time.perf_counter()
+        item = next(source, None)
+        self.metrics.parse_time += time.perf_counter() - parse_start
+        return item
 
-                # Increment the read index for table2
-                read_index_table2 += 1
+    def process_tuple(self, tuple_, epoch, ht_probe, ht_insert, probe, insert):
+        """
+        Probe and insert a tuple and process the join result, recording the metrics of the step.
+        """
+        metrics = self.metrics
+        if metrics.timing:
+            probe_start = time.perf_counter()
+            result = self.probe_and_insert(tuple_, epoch, ht_probe, ht_insert)
+            output_start = time.perf_counter()
+            self.process_join_result(result, probe, insert)
+            metrics.probe_time += output_start - probe_start
+            metrics.output_time += time.perf_counter() - output_start
+        else:
+            result = self.probe_and_insert(tuple_, epoch, ht_probe, ht_insert)
+            self.process_join_result(result, probe, insert)
 
-            # Check if we have processed all tuples from both tables
-            if read_index_table1 >= len(self.table1) and read_index_table2 >= len(self.table2):
-                break
+        if (metrics.tuples_read1 + metrics.tuples_read2) % metrics.sample_interval == 0:
+            metrics.sample(len(self.ht1), len(self.ht2))
 
+    def finish_join(self):
+        """
+        Finish the join once both inputs are exhausted: update the memory figures and close the metrics.
+        """
+        output_start = time.perf_counter()
+        self.sink.flush()
+        self.metrics.output_time += time.perf_counter() - output_start
+
+        self.update_peak_state_bytes()
+        self.metrics.sample(len(self.ht1), len(self.ht2))
+        self.metrics.finish()
+
+    def update_peak_state_bytes(self):
+        """
+        Estimate the peak memory of the hash tables from the peak number of entries and the average size of an
+        entry (see entry_sizeof), measured on a sample of the entries still in memory, or on the removed ones if the
+        tables are empty.
+        """
+        if self.compact:
+            # The arrays of a CompactHashTable never shrink, so their size now is their peak size
+            self.peak_state_bytes = sampled_sizeof(self.ht1, self.ht2)
+            return
+        entries = len(self.ht1) + len(self.ht2)
+        if entries:
+            entry_bytes = (sampled_sizeof(self.ht1, sizeof=self.entry_sizeof(1)) +
+                           sampled_sizeof(self.ht2, sizeof=self.entry_sizeof(2))) / entries
+        elif self.evicted_entries:
+            entry_bytes = self.evicted_bytes / self.evicted_entries
+        else:
+            entry_bytes = 0
+        self.peak_state_bytes = max(self.peak_state_bytes, int(entry_bytes * self.peak_entries))
+
+    def entry_sizeof(self, side):
+        """
+        Get the function measuring an entry of a hash table: with its row if the join owns the rows of that input,
+        without it otherwise.
+
+        :param side: 1 or 2, the hash table
+        """
+        return deep_sizeof if self.owns_rows[side] else sizeof_without_rows
 
     def process_join_result(self, triple, probe, insert):
         """
-        Print the join result.
+        Hand the join result to the sink.
         """
         if triple is not None:
-            self.logger.info(f"Matching records from probing {probe} and inserting {insert} => {triple}")
-            #self.logger.info(triple)
+            self.sink.write(triple)
+            if self.counter == 0 and self.start_time is not None:
+                self.time_to_first_result = time.perf_counter() - self.start_time
             self.counter += 1
+            self.metrics.record_match(triple)
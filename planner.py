@@ -0,0 +1,507 @@
+import math
+import sqlite3
+from datetime import timedelta
+from check_tables import CheckTables
+from columnar_table import EPOCH, to_epoch
+from merge_join import MergeJoin
+from numpy_join import NumpyJoin, np
+from pipelined_hash_join import HashJoin
+from semi_join import SemiJoin
+from spilling_hash_join import SpillingHashJoin
+from sqlite_join import SQLiteJoin
+from timestamp_filter import filter_tables
+
+
+# Strategy -> (operator, engine, lazy, eager); FTTJ is used if neither flag is set. The operator is what the join
+# returns: the matching pairs ("hash_join") or the rows of R ("semi_join"); the engine is how it computes them.
+STRATEGIES = {
+    "hash_join_fttj": ("hash_join", "hash", False, False),
+    "hash_join_lazy": ("hash_join", "hash", True, False),
+    "hash_join_compact": ("hash_join", "compact", True, False),
+    "spilling_hash_join_lazy": ("hash_join", "spilling", True, False),
+    "merge_join_fttj": ("hash_join", "merge", False, False),
+    "merge_join_lazy": ("hash_join", "merge", True, False),
+    "sqlite_join_fttj": ("hash_join", "sqlite", False, False),
+    "sqlite_join_lazy": ("hash_join", "sqlite", True, False),
+    "numpy_join_fttj": ("hash_join", "numpy", False, False),
+    "numpy_join_lazy": ("hash_join", "numpy", True, False),
+    "semi_join_fttj": ("semi_join", "hash", False, False),
+    "semi_join_eager": ("semi_join", "hash", False, True),
+    "semi_join_lazy": ("semi_join", "hash", True, False),
+    "merge_semi_join_fttj": ("semi_join", "merge", False, False),
+    "merge_semi_join_lazy": ("semi_join", "merge", True, False),
+    "sqlite_semi_join_fttj": ("semi_join", "sqlite", False, False),
+    "sqlite_semi_join_lazy": ("semi_join", "sqlite", True, False),
+    "numpy_semi_join_fttj": ("semi_join", "numpy", False, False),
+    "numpy_semi_join_lazy": ("semi_join", "numpy", True, False),
+}
+
+# Engines reading their inputs as streams instead of loading the tables (unless FTTJ, which filters loaded tables)
+STREAMING_ENGINES = ("compact", "spilling", "merge")
+
+# Rough costs in microseconds, fitted on benchmark.py runs; only their ratios matter for the choice
+LOAD_COST = 2.5  # Per row loaded into a ColumnarTable (fetch and timestamp parsing)
+STREAM_COST = 1.2  # Per row read from a stream
+PARSE_COST = 1.0  # Per timestamp parsed during the join
+FILTER_COST = 1.0  # FTTJ timestamp filter, per row (binary search in the timestamps of the other table)
+SORT_COST = 0.9  # FTTJ merge join, per row kept by the filter and sorted by id
+HASH_TUPLE_COST = 1.8  # Pipelined hash join, per tuple probed and inserted
+COMPACT_TUPLE_COST = 5.0  # Pipelined hash join with CompactHashTables, per tuple probed and inserted
+FETCH_COST = 11.0  # Compact hash join, per row of a result fetched back by id
+PARTITION_COST = 2.0  # Spilling hash join, per tuple assigned to a partition
+SPILL_COST = 9.0  # Spilling hash join, per tuple written to disk and read back
+MERGE_TUPLE_COST = 0.8  # Merge join, per row grouped and merged
+SQLITE_ROW_COST = 0.7  # Join evaluated by SQLite, per row of the tables (with the indexes of SQLiteJoin.prepare)
+SQLITE_FILTER_COST = 1.5  # FTTJ evaluated by SQLite, per row of the tables
+NUMPY_ROW_COST = 0.3  # NumPy join, per row of the tables
+LOOKUP_BUILD_COST = 0.3  # Semi-join, per row of S inserted into S_lookup
+LOOKUP_PROBE_COST = 0.6  # Semi-join, per row of R probed in S_lookup
+EAGER_BUILD_COST = 0.5  # Eager semi-join, per row of R inserted into R_lookup
+OUTPUT_COST = 1.0  # Per result
+
+# Rough memory in bytes, as measured by tracemalloc (MemoryTracker)
+ROW_OVERHEAD_BYTES = 263  # Row without the characters of its strings: tuple, id and three str objects
+TABLE_ROW_BYTES = 24  # ColumnarTable, per row besides the row: list slot, id and epoch
+FILTER_ENTRY_BYTES = 40  # FTTJ, per row kept by the filter: set and list slots
+HASH_ENTRY_BYTES = 115  # Hash table entry without the row: dict slot, (row, epoch) pair and epoch
+COMPACT_ENTRY_BYTES = 70  # CompactHashTable entry: key, row reference, epoch, index slot and spare capacity
+LOOKUP_ENTRY_BYTES = 125  # S_lookup entry: dict slot, id and epoch
+NUMPY_ROW_BYTES = 16  # NumPy join, per row of the tables: intersection of the id arrays
+RESULT_BYTES = 80  # Result triple (id, record1, record2) and its list slot, without the rows
+
+SPILL_PARTITIONS = 16  # Hash partitions of SpillingHashJoin, one of which is loaded back at a time
+
+NUM_BUCKETS = 64
+SAMPLE_SIZE = 1000
+
+
+class Planner:
+    def __init__(self, database1, database2, timestamp_diff, memory_budget=None, num_buckets=NUM_BUCKETS,
+                 sample_size=SAMPLE_SIZE, batch_size=1000):
+        """
+        Initialize the Planner object.
+
+        The planner chooses a join strategy without running any: it reads cheap statistics straight from the
+        database files (row count, id range, timestamp range, average row length and a histogram of the timestamps,
+        plus a sample of table1 looked up by id in table2 for the pairs of rows that share an id), estimates the
+        number of results, the running time and the memory of every strategy from them and picks the fastest one
+        that fits in the memory budget.
+
+        The caller fixes what the join returns: the operator, the predicate (FTTJ, or the timestamp window on the
+        pairs of rows, which the lazy and eager strategies evaluate alike) and for the semi-joins the table playing
+        S (the largest one by default, as in SemiJoin). The planner only chooses among the strategies returning
+        these results, which differ in the engine (hash tables of rows or compact ones, spilling to disk, merge,
+        SQLite or NumPy) and in how the inputs are read (loaded in memory, streamed, or left to SQLite), and thus
+        trade running time for memory.
+
+        The statistics are cached and only read again when a database changed, which SQLite reports through
+        PRAGMA data_version (changes by other connections) and total_changes (changes by this one).
+
+        The estimates are meant to rank the strategies rather than to predict exact figures.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param memory_budget: Memory in bytes the chosen strategy should stay within (no limit if None)
+        :param num_buckets: The number of buckets of the timestamp histograms
+        :param sample_size: The number of rows of table1 sampled
+        :param batch_size: The number of rows fetched per batch by the strategies streaming their inputs
+        """
+        self.database1 = database1
+        self.database2 = database2
+        self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.memory_budget = memory_budget
+        self.num_buckets = num_buckets
+        self.sample_size = sample_size
+        self.batch_size = batch_size
+        self.conn1 = sqlite3.connect(database1)
+        self.conn2 = sqlite3.connect(database2)
+        self.cache = {}  # connection -> (version, statistics)
+        self.sample_cache = None  # (versions of both databases, sample)
+
+    @staticmethod
+    def version(conn):
+        """
+        Get a value that changes whenever the database of a connection is modified.
+        """
+        return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+    def collect_stats(self, conn):
+        """
+        Read the statistics of the table of a database.
+
+        :param conn: Connection to the database
+        :return: Dictionary with the table name, count, min_id, max_id, min_ts, max_ts (in epoch seconds),
+                 row_bytes, bucket_width, histogram (the number of rows per timestamp bucket) and cumulative (the
+                 number of rows in the buckets before each bucket)
+        """
+        cursor = conn.cursor()
+        table_name = CheckTables.get_table_name(cursor)
+        cursor.execute(f"SELECT COUNT(*), MIN(id), MAX(id), MIN(timestamp), MAX(timestamp), "
+                       f"AVG(LENGTH(name) + LENGTH(email) + LENGTH(timestamp)) FROM {table_name}")
+        count, min_id, max_id, min_ts, max_ts, row_length = cursor.fetchone()
+
+        stats = {"name": table_name, "count": count, "min_id": min_id, "max_id": max_id, "min_ts": 0, "max_ts": 0,
+                 "row_bytes": ROW_OVERHEAD_BYTES + (row_length or 0), "bucket_width": 1, "histogram": [],
+                 "cumulative": []}
+        if count:
+            min_ts, max_ts = to_epoch(min_ts), to_epoch(max_ts)
+            width = (max_ts - min_ts) // self.num_buckets + 1
+            histogram = [0] * self.num_buckets
+            cursor.execute(f"SELECT (CAST(strftime('%s', timestamp) AS INTEGER) - ?) / ?, COUNT(*) FROM {table_name} "
+                           f"GROUP BY 1", (min_ts, width))
+            for bucket, bucket_count in cursor:
+                histogram[min(max(bucket, 0), self.num_buckets - 1)] += bucket_count
+            cumulative = [0] * self.num_buckets
+            for bucket in range(1, self.num_buckets):
+                cumulative[bucket] = cumulative[bucket - 1] + histogram[bucket - 1]
+            stats.update(min_ts=min_ts, max_ts=max_ts, bucket_width=width, histogram=histogram, cumulative=cumulative)
+        return stats
+
+    def get_stats(self):
+        """
+        Get the statistics of both tables, reading them again only for a database that changed.
+
+        :return: The statistics of table1 and table2
+        """
+        result = []
+        for conn in (self.conn1, self.conn2):
+            version = self.version(conn)
+            cached = self.cache.get(conn)
+            if cached is None or cached[0] != version:
+                cached = (version, self.collect_stats(conn))
+                self.cache[conn] = cached
+            result.append(cached[1])
+        return result
+
+    def collect_sample(self, stats1, stats2):
+        """
+        Sample rows of table1, evenly spread over the rowids, and look up their ids in table2.
+
+        :return: Tuple (number of rows sampled, list of (epoch1, epoch2) timestamps of the rows sharing an id)
+        """
+        step = max(1, stats1["count"] // self.sample_size)
+        sample = self.conn1.execute(f"SELECT id, timestamp FROM {stats1['name']} WHERE rowid % ? = 0 LIMIT ?",
+                                    (step, self.sample_size)).fetchall()
+        pairs = []
+        for start in range(0, len(sample), 500):  # Stay below the limit of SQL variables of old SQLite versions
+            timestamps = dict(sample[start:start + 500])
+            placeholders = ", ".join("?" * len(timestamps))
+            cursor = self.conn2.execute(f"SELECT id, timestamp FROM {stats2['name']} WHERE id IN ({placeholders})",
+                                        list(timestamps))
+            pairs.extend((to_epoch(timestamps[id_]), to_epoch(timestamp)) for id_, timestamp in cursor)
+        return len(sample), pairs
+
+    def get_sample(self):
+        """
+        Get the sample of rows sharing an id (see collect_sample), collecting it again only if a database changed.
+        """
+        versions = (self.version(self.conn1), self.version(self.conn2))
+        if self.sample_cache is None or self.sample_cache[0] != versions:
+            self.sample_cache = (versions, self.collect_sample(*self.get_stats()))
+        return self.sample_cache[1]
+
+    @staticmethod
+    def fraction_below(stats, epoch):
+        """
+        Estimate the fraction of the rows of a table with a timestamp below epoch, interpolating within buckets.
+        """
+        if not stats["count"]:
+            return 0.0
+        position = (epoch - stats["min_ts"]) / stats["bucket_width"]
+        if position <= 0:
+            return 0.0
+        histogram = stats["histogram"]
+        if position >= len(histogram):
+            return 1.0
+        bucket = int(position)
+        below = stats["cumulative"][bucket] + histogram[bucket] * (position - bucket)
+        return below / stats["count"]
+
+    def keep_probability(self, other, epoch):
+        """
+        Estimate the probability that a row with a given timestamp is kept by the FTTJ filter, i.e. has at least one
+        row of the other table within the timestamp window (a Poisson approximation of the number of such rows).
+        """
+        within = self.fraction_below(other, epoch + self.window) - self.fraction_below(other, epoch - self.window)
+        return 1 - math.exp(-other["count"] * within)
+
+    def filter_fraction(self, stats, other):
+        """
+        Estimate the fraction of the rows of a table kept by the FTTJ filter, from the middles of its buckets.
+        """
+        return sum(bucket_count * self.keep_probability(other, stats["min_ts"] + (bucket + 0.5) * stats["bucket_width"])
+                   for bucket, bucket_count in enumerate(stats["histogram"])) / max(1, stats["count"])
+
+    @staticmethod
+    def reads_tables(engine, fttj):
+        """
+        Tell how a strategy reads its inputs.
+
+        :return: "load" (ColumnarTables), "stream" (cursors) or None (SQLite joins the database files itself)
+        """
+        if engine == "sqlite":
+            return None
+        if fttj or engine not in STREAMING_ENGINES:
+            # The FTTJ filter needs the whole tables
+            return "load"
+        return "stream"
+
+    def spill_capacity(self, stats1, stats2):
+        """
+        Get the number of tuples SpillingHashJoin may keep in memory within the memory budget (every tuple if there
+        is no budget), leaving room for the spilled partition loaded back at a time in the cleanup phase.
+        """
+        count = max(1, stats1["count"] + stats2["count"])
+        if self.memory_budget is None:
+            return count
+        row_bytes = (stats1["count"] * stats1["row_bytes"] + stats2["count"] * stats2["row_bytes"]) / count
+        # held + (count - held) / SPILL_PARTITIONS tuples must fit in the budget
+        fitting = self.memory_budget / (HASH_ENTRY_BYTES + row_bytes)
+        return max(1, min(count, int((fitting - count / SPILL_PARTITIONS) * SPILL_PARTITIONS / (SPILL_PARTITIONS - 1))))
+
+    def estimate(self, strategy, S_name=None):
+        """
+        Estimate the results, running time and memory of a strategy, including reading its inputs.
+
+        :param strategy: A key of STRATEGIES
+        :param S_name: For the semi-joins, the table playing S (the largest table if None)
+        :return: Dictionary with the strategy, the S_name (None for the hash joins), the estimated rows (number of
+                 results), time (seconds) and memory (bytes)
+        """
+        operator, engine, lazy, eager = STRATEGIES[strategy]
+        fttj = not lazy and not eager
+        stats1, stats2 = self.get_stats()
+
+        if operator == "semi_join" and S_name is None:
+            S_name = stats1["name"] if stats1["count"] >= stats2["count"] else stats2["name"]
+
+        sampled, pairs = self.get_sample()
+        n1, n2 = stats1["count"], stats2["count"]
+        row_bytes1, row_bytes2 = stats1["row_bytes"], stats2["row_bytes"]
+        keys = n1 * len(pairs) / sampled if sampled else 0  # Ids present in both tables
+        if fttj:
+            # Both tables are filtered, then joined on the id only. The rows of a pair within the timestamp window
+            # keep each other; otherwise each one needs another row of the other table within the window.
+            rows = sum(1 if abs(epoch1 - epoch2) < self.window else
+                       self.keep_probability(stats2, epoch1) * self.keep_probability(stats1, epoch2)
+                       for epoch1, epoch2 in pairs)
+        else:
+            rows = sum(1 for epoch1, epoch2 in pairs if abs(epoch1 - epoch2) < self.window)
+        rows = keys * rows / len(pairs) if pairs else 0
+
+        cost = 0.0
+        memory = 0.0
+        reads = self.reads_tables(engine, fttj)
+        if reads == "load":
+            cost += (n1 + n2) * LOAD_COST
+            memory += n1 * (TABLE_ROW_BYTES + row_bytes1) + n2 * (TABLE_ROW_BYTES + row_bytes2)
+        elif reads == "stream":
+            cost += (n1 + n2) * STREAM_COST
+            memory += min(self.batch_size, n1) * row_bytes1 + min(self.batch_size, n2) * row_bytes2
+        if fttj:
+            kept1, kept2 = self.filter_fraction(stats1, stats2), self.filter_fraction(stats2, stats1)
+            if engine == "sqlite":
+                cost += (n1 + n2) * SQLITE_FILTER_COST
+            else:
+                cost += (n1 + n2) * FILTER_COST
+                memory += (n1 * kept1 + n2 * kept2) * FILTER_ENTRY_BYTES
+            n1, n2 = n1 * kept1, n2 * kept2
+
+        if operator == "hash_join":
+            S_name = None
+            if engine == "hash":
+                cost += (n1 + n2) * HASH_TUPLE_COST
+                memory += (n1 + n2) * HASH_ENTRY_BYTES
+            elif engine == "compact":
+                cost += (n1 + n2) * (PARSE_COST + COMPACT_TUPLE_COST) + rows * FETCH_COST
+                memory += (n1 + n2) * COMPACT_ENTRY_BYTES
+            elif engine == "spilling":
+                # The rows come from streams, so the join owns the rows it keeps in memory
+                held = min(n1 + n2, self.spill_capacity(stats1, stats2))
+                spilled = n1 + n2 - held
+                cost += (n1 + n2) * (PARSE_COST + HASH_TUPLE_COST + PARTITION_COST) + spilled * SPILL_COST
+                memory += ((held + spilled / SPILL_PARTITIONS) *
+                           (HASH_ENTRY_BYTES + (n1 * row_bytes1 + n2 * row_bytes2) / max(1, n1 + n2)))
+            elif engine == "merge":
+                # The lazy merge join only parses the timestamps of the ids in both tables, FTTJ sorts the tables
+                cost += (n1 + n2) * MERGE_TUPLE_COST + (2 * keys * PARSE_COST if lazy else (n1 + n2) * SORT_COST)
+            elif engine == "sqlite":
+                cost += (n1 + n2) * SQLITE_ROW_COST
+                memory += rows * (RESULT_BYTES + row_bytes1 + row_bytes2)  # SQLite returns new rows
+            else:
+                cost += (n1 + n2) * (NUMPY_ROW_COST + (0 if lazy else PARSE_COST))  # Filtered lists are parsed again
+                memory += (n1 + n2) * NUMPY_ROW_BYTES + rows * RESULT_BYTES
+        else:
+            if S_name == stats1["name"]:
+                nS, nR, R_row_bytes = n1, n2, row_bytes2
+            else:
+                nS, nR, R_row_bytes = n2, n1, row_bytes1
+            if engine == "hash":
+                cost += nS * LOOKUP_BUILD_COST + nR * LOOKUP_PROBE_COST
+                memory += nS * LOOKUP_ENTRY_BYTES + rows * 8
+                if eager:
+                    cost += nR * EAGER_BUILD_COST
+                    memory += nR * HASH_ENTRY_BYTES
+            elif engine == "merge":
+                cost += (nS + nR) * MERGE_TUPLE_COST + (2 * keys * PARSE_COST if lazy else (nS + nR) * SORT_COST)
+                memory += rows * (8 + (R_row_bytes if reads == "stream" else 0))
+            elif engine == "sqlite":
+                memory += rows * (8 + R_row_bytes)
+                cost += (nS + nR) * SQLITE_ROW_COST
+            else:
+                cost += (nS + nR) * (NUMPY_ROW_COST + (0 if lazy else PARSE_COST))
+                memory += (nS + nR) * NUMPY_ROW_BYTES + rows * 8
+
+        cost += rows * OUTPUT_COST
+        return {"strategy": strategy, "S_name": S_name, "rows": int(rows), "time": cost / 1e6, "memory": int(memory)}
+
+    @staticmethod
+    def candidates(operator, fttj=False):
+        """
+        Get the strategies returning the same results: those of one operator with the same predicate (the NumPy
+        ones only when NumPy is installed).
+
+        :param operator: "hash_join" or "semi_join"
+        :param fttj: True for the FTTJ strategies, False for the lazy and eager ones (the timestamp window)
+        :return: List of keys of STRATEGIES
+        """
+        if operator not in ("hash_join", "semi_join"):
+            raise ValueError(f"Unknown operator: {operator}")
+        return [strategy for strategy, (strategy_operator, engine, lazy, eager) in STRATEGIES.items()
+                if strategy_operator == operator and (lazy or eager) != fttj and (engine != "numpy" or np is not None)]
+
+    def estimates(self, operator, fttj=False, S_name=None):
+        """
+        Estimate the candidate strategies (see candidates).
+        """
+        return [self.estimate(strategy, S_name) for strategy in self.candidates(operator, fttj)]
+
+    def choose(self, operator, fttj=False, S_name=None):
+        """
+        Choose the fastest candidate strategy that fits in the memory budget, or the one using the least memory if
+        none fits.
+
+        :param operator: "hash_join" or "semi_join"
+        :param fttj: True to choose among the FTTJ strategies, False among the lazy and eager ones
+        :param S_name: For the semi-joins, the table playing S (the largest table if None)
+        :return: The estimate of the chosen strategy (see estimate)
+        """
+        estimates = self.estimates(operator, fttj, S_name)
+        fitting = [estimate for estimate in estimates
+                   if self.memory_budget is None or estimate["memory"] <= self.memory_budget]
+        if fitting:
+            return min(fitting, key=lambda estimate: estimate["time"])
+        return min(estimates, key=lambda estimate: estimate["memory"])
+
+    def explain(self, operator, fttj=False, S_name=None):
+        """
+        Describe the statistics, the estimates of the candidate strategies and the choice.
+
+        :param operator: As for choose
+        :param fttj: As for choose
+        :param S_name: As for choose
+        :return: The description as text
+        """
+        lines = ["Statistics:"]
+        for stats in self.get_stats():
+            if stats["count"]:
+                first = EPOCH + timedelta(seconds=stats["min_ts"])
+                last = EPOCH + timedelta(seconds=stats["max_ts"])
+                lines.append(f"  {stats['name']}: {stats['count']} rows, ids {stats['min_id']}..{stats['max_id']}, "
+                             f"timestamps {first} .. {last}, ~{stats['row_bytes']:.0f} bytes per row")
+            else:
+                lines.append(f"  {stats['name']}: empty")
+
+        chosen = self.choose(operator, fttj, S_name)
+        budget = "none" if self.memory_budget is None else f"{self.memory_budget / 1024 / 1024:.2f} MB"
+        predicate = "FTTJ" if fttj else "timestamp window"
+        lines.append(f"Estimates ({predicate}, timestamp_diff = {self.timestamp_diff} hours, memory budget: {budget}):")
+        lines.append(f"  {'strategy':<24}{'S':>10}{'rows':>12}{'time (s)':>12}{'memory (MB)':>14}")
+        for estimate in self.estimates(operator, fttj, S_name):
+            marker = "*" if estimate["strategy"] == chosen["strategy"] else " "
+            lines.append(f"{marker} {estimate['strategy']:<24}{estimate['S_name'] or '-':>10}{estimate['rows']:>12}"
+                         f"{estimate['time']:>12.4f}{estimate['memory'] / 1024 / 1024:>14.2f}")
+        lines.append(f"Chosen: {chosen['strategy']}")
+        return "\n".join(lines)
+
+    def create_join(self, operator, fttj=False, S_name=None, estimate=None, metrics=None, sink=None):
+        """
+        Create the join object of the chosen strategy, reading its inputs from the databases as the strategy does:
+        loaded as ColumnarTables, streamed (in id order for the merge joins), or not at all for SQLite, which joins
+        the database files itself. The FTTJ strategies get the filtered tables.
+
+        :param operator: As for choose
+        :param fttj: As for choose
+        :param S_name: As for choose
+        :param estimate: The estimate of the strategy to use, one of the candidates (the result of choose if None)
+        :param metrics: JoinMetrics object handed to the joins collecting metrics (HashJoin, SemiJoin and MergeJoin)
+        :param sink: ResultSink the results are handed to
+        :return: The join object; run it with run_join before the planner is closed, as the streams read from the
+                 connections of the planner
+        """
+        if estimate is None:
+            estimate = self.choose(operator, fttj, S_name)
+        elif estimate["strategy"] not in self.candidates(operator, fttj):
+            raise ValueError(f"{estimate['strategy']} does not return the results of the {operator} asked for")
+        join_operator, engine, lazy, eager = STRATEGIES[estimate["strategy"]]
+        S_name = estimate["S_name"]
+        stats1, stats2 = self.get_stats()
+        table1_name, table2_name = stats1["name"], stats2["name"]
+        check_tables = CheckTables(self.conn1, self.conn2)
+
+        reads = self.reads_tables(engine, not lazy and not eager)
+        if reads is None:
+            return SQLiteJoin(self.database1, self.database2, self.timestamp_diff, lazy, sink, S_name)
+        if reads == "stream":
+            table1, _, table2, _ = check_tables.stream_tables(self.batch_size, ordered=engine == "merge")
+        else:
+            table1, _, table2, _ = check_tables.load_tables(log_rows=False)
+        if not lazy and not eager:
+            filtered_table1, filtered_table2 = filter_tables(table1, table2, self.timestamp_diff)
+            if engine == "merge":
+                table1, table2 = sorted(filtered_table1), sorted(filtered_table2)
+            else:
+                table1, table2 = list(filtered_table1), list(filtered_table2)
+
+        if engine == "numpy":
+            return NumpyJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy, sink, S_name)
+        if engine == "merge":
+            return MergeJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy, S_name, metrics,
+                             sink)
+        if join_operator == "semi_join":
+            return SemiJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy, eager, S_name,
+                            metrics, sink)
+        if engine == "compact":
+            return HashJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy, metrics, sink,
+                            compact=True, fetch=check_tables.row_fetchers())
+        if engine == "spilling":
+            return SpillingHashJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy,
+                                    self.spill_capacity(stats1, stats2), SPILL_PARTITIONS, metrics=metrics, sink=sink)
+        return HashJoin(table1, table2, table1_name, table2_name, self.timestamp_diff, lazy, metrics, sink)
+
+    @staticmethod
+    def run_join(join, operator):
+        """
+        Run a join created by create_join with the method of its class, then close its connection if it has one.
+
+        :param join: The join object
+        :param operator: The operator it was created for
+        :return: What the method returns, i.e. R1 and the memory used for the semi-joins
+        """
+        try:
+            if operator == "semi_join":
+                return join.perform_semi_join()
+            if isinstance(join, HashJoin):
+                return join.perform_pipelined_hash_join()
+            if isinstance(join, MergeJoin):
+                return join.perform_merge_join()
+            return join.perform_join()
+        finally:
+            if hasattr(join, "close"):
+                join.close()
+
+    def close(self):
+        self.conn1.close()
+        self.conn2.close()
@@ -0,0 +1,177 @@
+import csv
+import json
+import sqlite3
+
+
+ROW_COLUMNS = ("id", "name", "email", "timestamp")
+
+
+def flatten(result):
+    """
+    Flatten a result into a flat tuple of values.
+
+    A join result (id, record1, record2) becomes id followed by the fields of both records, a semi-join result
+    (a row) stays as it is.
+    """
+    values = []
+    for value in result:
+        if isinstance(value, (tuple, list)):
+            values.extend(value)
+        else:
+            values.append(value)
+    return tuple(values)
+
+
+def result_columns(width):
+    """
+    Get column names for flattened results of a given width.
+    """
+    if width == len(ROW_COLUMNS):
+        return list(ROW_COLUMNS)
+    if width == 1 + 2 * len(ROW_COLUMNS):
+        return ["id"] + [f"{column}{side}" for side in (1, 2) for column in ROW_COLUMNS]
+    return [f"column{i}" for i in range(1, width + 1)]
+
+
+class ResultSink:
+    def __init__(self, batch_size=10000):
+        """
+        Initialize the ResultSink object, the base class of the sinks join results are handed to.
+
+        The join operators only call write, which appends the result to a buffer; the results are formatted and
+        written in batches by flush, outside the probe loop.
+
+        :param batch_size: The number of buffered results that triggers a flush
+        """
+        self.batch_size = batch_size
+        self.buffer = []
+        self.count = 0
+
+    def write(self, result):
+        self.buffer.append(result)
+        self.count += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.buffer = []
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class CountSink(ResultSink):
+    """
+    Sink that only counts the results.
+    """
+    def write(self, result):
+        self.count += 1
+
+    def write_batch(self, batch):
+        pass
+
+
+class ListSink(ResultSink):
+    """
+    Sink that keeps the results in memory, in the results list.
+    """
+    def __init__(self):
+        super().__init__()
+        self.results = []
+
+    def write(self, result):
+        self.results.append(result)
+        self.count += 1
+
+    def write_batch(self, batch):
+        pass
+
+
+class LoggingSink(ResultSink):
+    def __init__(self, logger, prefix="", batch_size=1000):
+        """
+        Initialize the LoggingSink object, which logs every result (one log record per batch).
+
+        :param logger: The logger to write to
+        :param prefix: Text put in front of every result
+        """
+        super().__init__(batch_size)
+        self.logger = logger
+        self.prefix = prefix
+
+    def write_batch(self, batch):
+        self.logger.info("\n".join(f"{self.prefix}{result}" for result in batch))
+
+
+class FileSink(ResultSink):
+    def __init__(self, path, file_format="csv", batch_size=10000):
+        """
+        Initialize the FileSink object, which writes the flattened results to a CSV or JSON Lines file.
+
+        :param path: Path of the output file
+        :param file_format: "csv" or "jsonl"
+        """
+        if file_format not in ("csv", "jsonl"):
+            raise ValueError(f"Unknown file format: {file_format}")
+        super().__init__(batch_size)
+        self.file_format = file_format
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file) if file_format == "csv" else None
+        self.header_written = False
+
+    def write_batch(self, batch):
+        rows = [flatten(result) for result in batch]
+        if self.file_format == "csv":
+            if not self.header_written:
+                self.writer.writerow(result_columns(len(rows[0])))
+                self.header_written = True
+            self.writer.writerows(rows)
+        else:
+            self.file.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class SQLiteSink(ResultSink):
+    def __init__(self, database, table_name="join_results", batch_size=10000):
+        """
+        Initialize the SQLiteSink object, which inserts the flattened results into a table with executemany.
+
+        The table is (re)created with the columns of the first batch.
+
+        :param database: Path to the database file
+        :param table_name: The name of the result table
+        """
+        super().__init__(batch_size)
+        self.conn = sqlite3.connect(database)
+        self.table_name = table_name
+        self.insert = None
+
+    def write_batch(self, batch):
+        rows = [flatten(result) for result in batch]
+        if self.insert is None:
+            columns = result_columns(len(rows[0]))
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.table_name}")
+            self.conn.execute(f"CREATE TABLE {self.table_name} ({', '.join(columns)})")
+            self.insert = (f"INSERT INTO {self.table_name} ({', '.join(columns)}) "
+                           f"VALUES ({', '.join('?' * len(columns))})")
+        self.conn.executemany(self.insert, rows)
+        self.conn.commit()
+
+    def close(self):
+        super().close()
+        self.conn.close()
@@ -1,27 +1,44 @@
-from datetime import datetime
 import logging
 import sys
+import time
+from columnar_table import id_column, epoch_column
+from compact_hash_table import CompactHashTable
+from join_metrics import JoinMetrics
+from memory_usage import deep_sizeof, sampled_sizeof, sizeof_without_rows, to_mb
+from result_sinks import LoggingSink
 
 
 class SemiJoin:
-    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, eager):
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, eager, S_name=None,
+                 metrics=None, sink=None, compact=False):
         """
         Initialize the SemiJoin object.
 
         :param table1: The first table.
         :param table2: The second table.
         :param lazy: A flag indicating lazy evaluation.
+        :param S_name: The name of the table to use as S. If None, the largest table is used.
+        :param metrics: JoinMetrics object collecting what the join does (a new one if None).
+        :param sink: ResultSink the rows of R1 are handed to (a LoggingSink if None).
+        :param compact: Use CompactHashTables instead of dictionaries for S_lookup and R_lookup.
         """
         self.table1 = table1
         self.table2 = table2
         self.table1_name = table1_name
         self.table2_name = table2_name
         self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
         self.lazy = lazy
         self.eager = eager
+        self.S_name = S_name
+        self.compact = compact
         self.counter = 0 # Initialize counter for counting the matching records
+        # Memory of the result and lookup dictionaries, without the rows, which are held by the tables
+        self.peak_state_bytes = 0
+        self.metrics = metrics if metrics is not None else JoinMetrics()
         self.logger = logging.getLogger("SemiJoin")
         self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger)
 
     def get_largest_table(self):
         """
@@ -39,12 +56,58 @@ class SemiJoin:
             self.logger.info(f"{self.table2_name} is the largest")
             return self.table2
 
+    def get_roles(self):
+        """
+        Determine which table plays S (the largest, unless S_name is given) and which plays R.
+
+        :return: The tables S and R.
+        """
+        if self.S_name is None:
+            S = self.get_largest_table()
+        else:
+            S = self.table1 if self.S_name == self.table1_name else self.table2
+        R = self.table1 if S is self.table2 else self.table2
+
+        table_S_name = self.table1_name if S is self.table1 else self.table2_name
+        self.logger.info(f"S = {table_S_name}")
+        table_R_name = self.table1_name if R is self.table1 else self.table2_name
+        self.logger.info(f"R = {table_R_name}")
+
+        return S, R
+
+    @staticmethod
+    def compact_lookup(items, size, fetch=None):
+        """
+        Build a CompactHashTable from (id, value) pairs.
+
+        :param items: The (id, value) pairs, the value being an epoch, or a (row, epoch) pair if fetch is given
+        :param size: The number of pairs
+        :param fetch: Function returning the row at an offset
+        :return: The CompactHashTable
+        """
+        lookup = CompactHashTable(fetch, size)
+        for key, value in items:
+            lookup[key] = value
+        return lookup
+
+    def add_result(self, R1, row):
+        """
+        Add a row of R to the result set, measuring the time spent on the output.
+        """
+        output_start = time.perf_counter() if self.metrics.timing else 0
+        R1.append(row)
+        self.sink.write(row)
+        self.counter += 1
+        self.metrics.record_match(row)
+        if self.metrics.timing:
+            self.metrics.output_time += time.perf_counter() - output_start
+
     def perform_semi_join(self):
         """
         Perform the semi-join operation between two tables.
 
         Steps:
-        1. Determine the largest table between table1 and table2.
+        1. Determine the largest table between table1 and table2 (unless S_name is given).
         2. Compute S1 based on the chosen strategy (lazy, eager, or join operation after tables are filtered).
         3. Compute R1 = R semi-join S1 based on the chosen strategy.
         4. Return the result of the semi-join operation and the memory size used.
@@ -52,7 +115,7 @@ class SemiJoin:
         Strategies:
         - Lazy :
             - S_lookup: an index-like structure in the form of a dictionary that maps the 'id' values to their
-                        corresponding 'timestamp' values.
+                        corresponding 'timestamp' values (in epoch seconds).
             - R1 = R semi-join S_lookup:
                 - For each row in R, check if the id exists in S_lookup.
                 - If it exists, calculate the timestamp difference between R and S1.
@@ -61,9 +124,9 @@ class SemiJoin:
         - Eager :
               Now, instead of fetching rows from R one at a time, all rows from R are fetched in advance.
             - S_lookup: an index-like structure in the form of a dictionary that maps the 'id' values to their
-                        corresponding 'timestamp' values.
+                        corresponding 'timestamp' values (in epoch seconds).
             - R_lookup: an index-like structure in the form of a dictionary that maps the 'id' values to their
-                        corresponding row values from R table.
+                        corresponding row values from R table and their timestamp in epoch seconds.
             - R1 = R_lookup semi-join S_lookup:
                 - For each key in R_lookup, check if it exists in S_lookup.
                 - If it exists, calculate the timestamp difference between R_lookup and S_lookup.
@@ -78,70 +141,106 @@ class SemiJoin:
 
         Returns:
         - R1: The result of the semi-join operation.
-        - size_used: The memory size (in MB) used by the result and lookup dictionaries.
+        - size_used: The memory size (in MB) used by the result and lookup dictionaries, including the rows and
+                     values they hold.
         """
 
-        S = self.get_largest_table()
-        R = self.table1 if S == self.table2 else self.table2
-
-        table_S_name = self.table1_name if S == self.table1 else self.table2_name
-        self.logger.info(f"S = {table_S_name}")
-        table_R_name = self.table1_name if R == self.table1 else self.table2_name
-        self.logger.info(f"R = {table_R_name}")
+        S, R = self.get_roles()
 
         self.logger.info("Computing R1 = R semi-join S1:")
 
+        metrics = self.metrics
+        metrics.start()
+        metrics.tuples_read1 = len(self.table1)
+        metrics.tuples_read2 = len(self.table2)
+
         R1 = []
 
         # Lazy
         if self.lazy:
-            S_lookup = {row[0]: row[3] for row in S}
+            parse_start = time.perf_counter()
+            if self.compact:
+                S_lookup = self.compact_lookup(zip(id_column(S), epoch_column(S)), len(S))
+            else:
+                S_lookup = dict(zip(id_column(S), epoch_column(S)))
+            R_epochs = epoch_column(R)
+            metrics.parse_time += time.perf_counter() - parse_start
             self.logger.info("\n============================== Semi Join Lazy ==============================")
-            for row in R:
+            probe_start, output_time = time.perf_counter(), metrics.output_time
+            for row, epoch_R in zip(R, R_epochs):
                 row_R_id = row[0]
+                metrics.probes += 1
                 if row_R_id in S_lookup:
+                    metrics.key_hits += 1
                     timestamp_S = S_lookup[row_R_id]
-                    # Calculate the timestamp difference in hours
-                    time_diff = (abs(datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S")
-                                     - datetime.strptime(timestamp_S, "%Y-%m-%d %H:%M:%S"))).total_seconds() / 3600
-                    if time_diff < self.timestamp_diff:
+                    # Compare the timestamp difference in seconds
+                    if abs(epoch_R - timestamp_S) < self.window:
                         # Add the row to the result set
-                        R1.append(row)
-                        self.logger.info(row)
-                        self.counter += 1
+                        self.add_result(R1, row)
+                    else:
+                        metrics.record_rejection(row_R_id)
+            metrics.probe_time += time.perf_counter() - probe_start - (metrics.output_time - output_time)
 
-            size_used = (sys.getsizeof(R1) + sys.getsizeof(S_lookup)) / 1024 / 1024
+            metrics.sample(len(S_lookup), 0)
+            self.peak_state_bytes = sys.getsizeof(R1) + sampled_sizeof(S_lookup)
 
         # Eager
         elif self.eager:
             self.logger.info("\n============================== Semi Join Eager ==============================")
-            S_lookup = {row[0]: (row[3]) for row in S}
-            R_lookup = {row[0]: row for row in R}
-            for key in R_lookup.keys():
+            parse_start = time.perf_counter()
+            if self.compact:
+                S_lookup = self.compact_lookup(zip(id_column(S), epoch_column(S)), len(S))
+                R_lookup = self.compact_lookup(((row[0], (row, epoch)) for row, epoch in zip(R, epoch_column(R))),
+                                               len(R), R.__getitem__)
+            else:
+                S_lookup = dict(zip(id_column(S), epoch_column(S)))
+                R_lookup = {row[0]: (row, epoch) for row, epoch in zip(R, epoch_column(R))}
+            metrics.parse_time += time.perf_counter() - parse_start
+            probe_start, output_time = time.perf_counter(), metrics.output_time
+            for key in R_lookup:
+                metrics.probes += 1
                 if key in S_lookup:
-                    rowR = R_lookup[key]
-                    time_diff = (abs(datetime.strptime(rowR[3], "%Y-%m-%d %H:%M:%S")
-                                     - datetime.strptime(S_lookup[key], "%Y-%m-%d %H:%M:%S"))).total_seconds() / 3600
-                    if time_diff < self.timestamp_diff:
+                    metrics.key_hits += 1
+                    rowR, epoch_R = R_lookup[key]
+                    if abs(epoch_R - S_lookup[key]) < self.window:
                         # Add the row to the result set
-                        R1.append(rowR)
-                        self.logger.info(rowR)
-                        self.counter += 1
+                        self.add_result(R1, rowR)
+                    else:
+                        metrics.record_rejection(key)
+            metrics.probe_time += time.perf_counter() - probe_start - (metrics.output_time - output_time)
 
-            size_used = (sys.getsizeof(R1) + sys.getsizeof(S_lookup) + sys.getsizeof(R_lookup)) / 1024 / 1024
+            metrics.sample(len(S_lookup), len(R_lookup))
+            self.peak_state_bytes = (sys.getsizeof(R1) + sampled_sizeof(S_lookup) +
+                                     sampled_sizeof(R_lookup, sizeof=sizeof_without_rows))
 
         # Check only id -  timestamps are filtered before join
         else:
             self.logger.info("\n============================== Semi Join FTTJ ==============================")
-            S_lookup = {row[0]: row[3] for row in S}
+            parse_start = time.perf_counter()
+            if self.compact:
+                S_lookup = self.compact_lookup(((row[0], None) for row in S), len(S))  # Only the ids are needed
+            else:
+                S_lookup = {row[0]: row[3] for row in S}
+            metrics.parse_time += time.perf_counter() - parse_start
+            probe_start, output_time = time.perf_counter(), metrics.output_time
             for row in R:
                 row_R_id = row[0]
+                metrics.probes += 1
                 if row_R_id in S_lookup:
+                    metrics.key_hits += 1
                     # Add the row to the result set
-                    R1.append(row)
-                    self.logger.info(row)
-                    self.counter += 1
+                    self.add_result(R1, row)
+            metrics.probe_time += time.perf_counter() - probe_start - (metrics.output_time - output_time)
+
+            metrics.sample(len(S_lookup), 0)
+            # The timestamps of S_lookup are the strings of the rows of S
+            self.peak_state_bytes = sys.getsizeof(R1) + sampled_sizeof(S_lookup, sizeof=lambda key, _: deep_sizeof(key))
+
+        output_start = time.perf_counter()
+        self.sink.flush()
+        metrics.output_time += time.perf_counter() - output_start
+        metrics.finish()
 
-            size_used = (sys.getsizeof(R1) + sys.getsizeof(S_lookup)) / 1024 / 1024
+        size_used = to_mb(self.peak_state_bytes)
 
         return R1, size_used
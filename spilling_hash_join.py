@@ -0,0 +1,154 @@
+import os
+import pickle
+import tempfile
+from memory_usage import sampled_sizeof
+from pipelined_hash_join import HashJoin
+
+
+class SpillingHashJoin(HashJoin):
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, lazy, memory_budget,
+                 num_partitions=16, spill_dir=None, metrics=None, sink=None):
+        """
+        Initialize the SpillingHashJoin object.
+
+        The hash tables are split into hash partitions on the join key. When ht1 and ht2 together hold more than
+        memory_budget tuples, the largest partition of both tables is flushed to disk and every later tuple of
+        that partition is written straight to disk. The spilled partitions are joined in a cleanup phase once
+        both inputs are exhausted (XJoin-style).
+
+        :param memory_budget: Maximum number of tuples kept in ht1 and ht2 together
+        :param num_partitions: Number of hash partitions
+        :param spill_dir: Directory for the spill files (the system temporary directory if None)
+        :param metrics: JoinMetrics object collecting what the join does (a new one if None)
+        :param sink: ResultSink the join results are handed to (a LoggingSink if None)
+        """
+        super().__init__(table1, table2, table1_name, table2_name, timestamp_diff, lazy, metrics, sink)
+        self.memory_budget = memory_budget
+        self.num_partitions = num_partitions
+        self.spill_dir = spill_dir
+        self.partition_sizes = [0] * num_partitions  # Number of in-memory tuples per partition
+        self.spilled = set()  # Partitions that live on disk
+        self.spill_files = {}  # (side, partition) -> open spill file
+        self.temp_dir = None
+        self.spilled_tuples = 0
+        self.spilled_bytes = 0
+
+    def partition(self, key):
+        return hash(key) % self.num_partitions
+
+    def write_spilled(self, side, partition, tuple_, epoch, flushed):
+        """
+        Append a tuple to the spill file of a partition.
+
+        :param side: 1 or 2, the table the tuple comes from
+        :param partition: The partition of the tuple
+        :param flushed: True if the tuple was in memory when its partition was spilled (and thus already joined
+                        with every tuple that arrived before the spill)
+        """
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix="hash_join_", dir=self.spill_dir)
+        spill_file = self.spill_files.get((side, partition))
+        if spill_file is None:
+            path = os.path.join(self.temp_dir.name, f"table{side}_partition{partition}.pkl")
+            spill_file = open(path, "wb")
+            self.spill_files[(side, partition)] = spill_file
+        pickle.dump((tuple_, epoch, flushed), spill_file, pickle.HIGHEST_PROTOCOL)
+        self.spilled_tuples += 1
+
+    def spill_partition(self, partition):
+        """
+        Move a partition of both hash tables to disk.
+        """
+        for side, ht in ((1, self.ht1), (2, self.ht2)):
+            keys = [key for key in ht if self.partition(key) == partition]
+            entries = [ht.pop(key) for key in keys]
+            self.evicted_entries += len(entries)
+            self.evicted_bytes += sampled_sizeof(keys) + sampled_sizeof(entries, sizeof=self.entry_sizeof(side))
+            for tuple_, epoch in entries:
+                self.write_spilled(side, partition, tuple_, epoch, True)
+
+        self.partition_sizes[partition] = 0
+        self.spilled.add(partition)
+        self.logger.debug(f"Spilled partition {partition} to disk")
+
+    def probe_and_insert(self, tuple_, epoch, ht_probe, ht_insert):
+        """
+        Perform probing and insertion, writing tuples of spilled partitions to disk instead.
+
+        :return: Result set if a match is found in memory, None otherwise
+        """
+        partition = self.partition(tuple_[0])
+        side = 1 if ht_insert is self.ht1 else 2
+
+        if partition in self.spilled:
+            self.write_spilled(side, partition, tuple_, epoch, False)
+            return None
+
+        size_before = len(ht_insert)
+        result_set = super().probe_and_insert(tuple_, epoch, ht_probe, ht_insert)
+        self.partition_sizes[partition] += len(ht_insert) - size_before
+
+        if len(self.ht1) + len(self.ht2) > self.memory_budget:
+            largest = max(range(self.num_partitions), key=lambda p: self.partition_sizes[p])
+            self.spill_partition(largest)
+
+        return result_set
+
+    @staticmethod
+    def read_spilled(spill_file):
+        """
+        Read back the tuples of a closed spill file.
+
+        :return: Iterator of (tuple_, epoch, flushed) records
+        """
+        if spill_file is None:
+            return
+        with open(spill_file.name, "rb") as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    break
+
+    def join_spilled(self):
+        """
+        Join the spilled partitions of both tables.
+
+        A pair in which both tuples were flushed from memory was already emitted while the tuples were in memory,
+        so only pairs with at least one tuple written after the spill are emitted here.
+        """
+        for spill_file in self.spill_files.values():
+            self.spilled_bytes += spill_file.tell()
+            spill_file.close()
+
+        for partition in sorted(self.spilled):
+            partition_ht1 = {tuple_[0]: (tuple_, epoch, flushed) for tuple_, epoch, flushed
+                             in self.read_spilled(self.spill_files.get((1, partition)))}
+            # Only one partition is loaded at a time, next to what is left in memory; its rows were read back from
+            # disk, so the join owns them
+            loaded_bytes = (sampled_sizeof(partition_ht1) + sampled_sizeof(self.ht1, sizeof=self.entry_sizeof(1)) +
+                            sampled_sizeof(self.ht2, sizeof=self.entry_sizeof(2)))
+            self.peak_state_bytes = max(self.peak_state_bytes, loaded_bytes)
+            for tuple_, epoch, flushed in self.read_spilled(self.spill_files.get((2, partition))):
+                key = tuple_[0]
+                if key not in partition_ht1:
+                    continue
+                record1, epoch1, flushed1 = partition_ht1[key]
+                if flushed1 and flushed:
+                    continue
+                self.metrics.key_hits += 1
+                if not self.lazy or abs(epoch1 - epoch) < self.window:
+                    self.process_join_result((key, record1, tuple_), self.table1_name, self.table2_name)
+                else:
+                    self.metrics.record_rejection(key)
+
+        if self.temp_dir is not None:
+            self.temp_dir.cleanup()
+            self.temp_dir = None
+
+    def finish_join(self):
+        """
+        Join the spilled partitions before finishing the join.
+        """
+        self.join_spilled()
+        super().finish_join()
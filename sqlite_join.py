@@ -0,0 +1,173 @@
+import logging
+import sqlite3
+from memory_usage import sampled_sizeof, to_mb
+from result_sinks import LoggingSink
+
+
+COLUMNS = ("id", "name", "email", "timestamp")
+
+
+def select_columns(alias):
+    """
+    Get the columns of a table alias as a SELECT list.
+    """
+    return ", ".join(f"{alias}.{column}" for column in COLUMNS)
+
+
+def epoch(alias=None):
+    """
+    SQL expression of the timestamp of a table alias in epoch seconds. The queries must spell it exactly like
+    the expression indexes of prepare_table for SQLite to use them.
+    """
+    column = "timestamp" if alias is None else f"{alias}.timestamp"
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+class SQLiteJoin:
+    def __init__(self, database1, database2, timestamp_diff, lazy, sink=None, S_name=None):
+        """
+        Initialize the SQLiteJoin object.
+
+        The joins are pushed down to SQLite: database2 is attached to the connection of database1 and the
+        FTTJ, lazy and semi-join variants are evaluated as SQL, with the results streamed back from the cursor.
+
+        :param database1: Path to the first database file
+        :param database2: Path to the second database file
+        :param timestamp_diff: Maximum timestamp difference in hours
+        :param lazy: A flag indicating lazy evaluation (the timestamp predicate is part of the join); if False,
+                     both tables are filtered on their timestamps before the join (FTTJ)
+        :param sink: ResultSink the results are handed to (a LoggingSink if None)
+        :param S_name: For the semi-join, the name of the table to use as S. If None, the largest table is used.
+        """
+        self.timestamp_diff = timestamp_diff
+        self.window = timestamp_diff * 3600  # Timestamp difference in seconds
+        self.lazy = lazy
+        self.S_name = S_name
+        self.counter = 0  # Initialize counter for counting the matching records
+        self.peak_state_bytes = 0  # Memory of the results on the Python side (SQLite's own memory is not included)
+        self.conn = sqlite3.connect(database1)
+        self.conn.execute("ATTACH DATABASE ? AS db2", (database2,))
+        self.table1_name = self.get_table_name("main")
+        self.table2_name = self.get_table_name("db2")
+        self.table1 = f"main.{self.table1_name}"
+        self.table2 = f"db2.{self.table2_name}"
+        self.logger = logging.getLogger("SQLiteJoin")
+        self.logger.setLevel(logging.INFO)
+        self.sink = sink if sink is not None else LoggingSink(self.logger)
+
+    def get_table_name(self, schema):
+        """
+        Get the table name of an attached database.
+
+        :param schema: The schema name of the database ("main" or "db2")
+        :return: Table name
+        """
+        cursor = self.conn.execute(
+            f"SELECT name FROM {schema}.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def prepare_table(self, schema, table_name):
+        """
+        Make sure a table has the indexes the joins use, without changing its columns.
+
+        An index on (id, timestamp in epoch seconds) serves the id joins and an index on the epoch alone serves the
+        FTTJ timestamp filter. Both are expression indexes, so SQLite keeps them up to date when rows are inserted
+        or their timestamps updated.
+        """
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table_name}_id_epoch "
+                          f"ON {table_name} (id, {epoch()})")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table_name}_epoch ON {table_name} ({epoch()})")
+        self.conn.commit()
+
+    def prepare(self):
+        self.prepare_table("main", self.table1_name)
+        self.prepare_table("db2", self.table2_name)
+
+    def window_filter(self, alias, other_table):
+        """
+        SQL condition keeping the rows of alias that have a row of other_table within the timestamp window.
+        """
+        return (f"EXISTS (SELECT 1 FROM {other_table} AS o "
+                f"WHERE {epoch('o')} > {epoch(alias)} - :window AND {epoch('o')} < {epoch(alias)} + :window)")
+
+    def iter_join(self):
+        """
+        Stream the join results.
+
+        :return: Iterator of (id, record1, record2) triples
+        """
+        self.prepare()
+        select = (f"SELECT {select_columns('a')}, {select_columns('b')} "
+                  f"FROM {self.table1} AS a JOIN {self.table2} AS b ON a.id = b.id")
+        if self.lazy:
+            query = f"{select} WHERE abs({epoch('a')} - {epoch('b')}) < :window"
+        else:
+            query = f"{select} WHERE {self.window_filter('a', self.table2)} AND {self.window_filter('b', self.table1)}"
+
+        for row in self.conn.execute(query, {"window": self.window}):
+            yield row[0], row[:4], row[4:]
+
+    def iter_semi_join(self, S_name=None):
+        """
+        Stream the rows of R semi-join S, where S is the largest table unless S_name (or the S_name of the join) is
+        given.
+
+        :return: Iterator of rows of R
+        """
+        self.prepare()
+        if S_name is None:
+            S_name = self.S_name
+        if S_name is None:
+            count1 = self.conn.execute(f"SELECT COUNT(*) FROM {self.table1}").fetchone()[0]
+            count2 = self.conn.execute(f"SELECT COUNT(*) FROM {self.table2}").fetchone()[0]
+            S_name = self.table1_name if count1 >= count2 else self.table2_name
+        S, R = (self.table1, self.table2) if S_name == self.table1_name else (self.table2, self.table1)
+        self.logger.info(f"S = {S_name}")
+
+        if self.lazy:
+            # Lazy and eager only differ in how Python fetches R, SQLite evaluates both the same way
+            condition = (f"EXISTS (SELECT 1 FROM {S} AS s "
+                         f"WHERE s.id = r.id AND abs({epoch('s')} - {epoch('r')}) < :window)")
+        else:
+            condition = (f"{self.window_filter('r', S)} AND "
+                         f"EXISTS (SELECT 1 FROM {S} AS s WHERE s.id = r.id AND {self.window_filter('s', R)})")
+
+        yield from self.conn.execute(f"SELECT {select_columns('r')} FROM {R} AS r WHERE {condition}", {"window": self.window})
+
+    def perform_join(self):
+        """
+        Perform the join in SQLite.
+
+        :return: The join results as (id, record1, record2) triples
+        """
+        self.logger.info("\n============================== SQLite Join ==============================")
+        results = []
+        for triple in self.iter_join():
+            self.sink.write(triple)
+            results.append(triple)
+        self.sink.flush()
+        self.counter = len(results)
+        self.peak_state_bytes = sampled_sizeof(results)
+        return results
+
+    def perform_semi_join(self, S_name=None):
+        """
+        Perform the semi-join in SQLite.
+
+        Returns:
+        - R1: The result of the semi-join operation.
+        - size_used: The memory size (in MB) used by the result.
+        """
+        self.logger.info("\n============================== SQLite Semi Join ==============================")
+        R1 = []
+        for row in self.iter_semi_join(S_name):
+            self.sink.write(row)
+            R1.append(row)
+        self.sink.flush()
+        self.counter = len(R1)
+        self.peak_state_bytes = sampled_sizeof(R1)
+        return R1, to_mb(self.peak_state_bytes)
+
+    def close(self):
+        self.conn.close()
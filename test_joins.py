@@ -0,0 +1,223 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from columnar_table import to_epoch
+from compact_hash_table import CompactHashTable
+from pipelined_hash_join import HashJoin, row_id
+from result_sinks import ListSink
+from spilling_hash_join import SpillingHashJoin
+from window_hash_join import WindowHashJoin
+
+
+TIMESTAMP_DIFF = 6  # in hours
+DISORDER = 2  # Hours a row may arrive after rows with later timestamps
+ALLOWED_LATENESS = 3  # in hours, more than DISORDER so that the window join misses no match
+SEEDS = range(5)
+
+
+def random_table(rng, table, size, num_ids, days=2):
+    """
+    Generate the rows of a table with unique random ids and random timestamps.
+
+    :param rng: random.Random generator
+    :param table: 1 or 2, used in the names so that the rows of both tables differ
+    :param size: The number of rows
+    :param num_ids: The ids are drawn from 1..num_ids
+    :param days: The timestamps are spread over that many days
+    :return: List of (id, name, email, timestamp) rows in random id order
+    """
+    start = datetime(2023, 6, 1)
+    rows = []
+    for id_ in rng.sample(range(1, num_ids + 1), size):
+        timestamp = start + timedelta(seconds=rng.randrange(days * 86400))
+        rows.append((id_, f"Name_{table}_{id_}", f"email_{table}_{id_}@example.com",
+                     timestamp.strftime("%Y-%m-%d %H:%M:%S")))
+    return rows
+
+
+def arrival_order(rng, table, disorder=DISORDER):
+    """
+    Order the rows of a table roughly by timestamp, each row arriving up to disorder hours late.
+    """
+    return sorted(table, key=lambda row: to_epoch(row[3]) + rng.uniform(0, disorder * 3600))
+
+
+def nested_loop_join(table1, table2, timestamp_diff, lazy=True):
+    """
+    Reference join: compare every pair of rows.
+
+    :param lazy: Whether the timestamp window is checked (the id is the only predicate otherwise)
+    :return: Sorted list of (id, record1, record2) triples
+    """
+    window = timestamp_diff * 3600
+    return sorted((record1[0], record1, record2) for record1 in table1 for record2 in table2
+                  if record1[0] == record2[0] and
+                  (not lazy or abs(to_epoch(record1[3]) - to_epoch(record2[3])) < window))
+
+
+def sorted_results(join, table1):
+    """
+    Get the results a join wrote into its ListSink, every triple in (id, record1, record2) order, as the probing
+    tuple comes second.
+
+    :param table1: The rows of table1
+    :return: Sorted list of (id, record1, record2) triples
+    """
+    rows1 = set(table1)
+    return sorted((key, first, second) if first in rows1 else (key, second, first)
+                  for key, first, second in join.sink.results)
+
+
+def join_results(join, table1):
+    """
+    Run a pipelined hash join and get its results (see sorted_results).
+    """
+    join.perform_pipelined_hash_join()
+    return sorted_results(join, table1)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("lazy", [True, False])
+@pytest.mark.parametrize("streamed", [False, True])
+def test_spilling_hash_join_matches_nested_loop(tmp_path, seed, lazy, streamed):
+    rng = random.Random(seed)
+    table1 = random_table(rng, 1, 300, 500)
+    table2 = random_table(rng, 2, 200, 500)
+    inputs = (iter(table1), iter(table2)) if streamed else (table1, table2)
+    join = SpillingHashJoin(*inputs, "table1", "table2", TIMESTAMP_DIFF, lazy, memory_budget=40, num_partitions=4,
+                            spill_dir=str(tmp_path), sink=ListSink())
+
+    assert join_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF, lazy)
+    assert join.spilled_tuples > 0
+    assert not list(tmp_path.iterdir())  # The spill files are removed
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_spilling_hash_join_without_spilling(seed):
+    rng = random.Random(seed)
+    table1 = random_table(rng, 1, 100, 150)
+    table2 = random_table(rng, 2, 100, 150)
+    join = SpillingHashJoin(table1, table2, "table1", "table2", TIMESTAMP_DIFF, True, memory_budget=1000,
+                            sink=ListSink())
+
+    assert join_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF)
+    assert join.spilled_tuples == 0
+
+
+def assert_same_table(table, expected, keys):
+    assert len(table) == len(expected)
+    assert sorted(table) == sorted(expected)
+    for key in keys:
+        assert (key in table) == (key in expected)
+        assert table.get(key) == expected.get(key)
+        if table.fetch is not None:
+            assert table.get_epoch(key) == (expected[key][1] if key in expected else None)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_compact_hash_table_matches_dict(seed):
+    rng = random.Random(seed)
+    rows = {}  # rowid -> row, as the database would return them
+    table = CompactHashTable(rows.__getitem__, reference=row_id)
+    expected = {}
+    # Few keys, so that keys are overwritten and deletions shift back long probe sequences; large keys too
+    keys = list(range(1, 300)) + [2 ** 40 + key for key in range(100)]
+
+    for step in range(5000):
+        key = rng.choice(keys)
+        if key in expected and rng.random() < 0.5:
+            del table[key]
+            del expected[key]
+        else:
+            row = (key, f"Name_{step}", f"email_{step}@example.com", "2023-06-01 00:00:00")
+            rows[key] = row
+            epoch = rng.randrange(2 ** 31)
+            table[key] = (row, epoch)
+            expected[key] = (row, epoch)
+        if step % 250 == 0:
+            assert_same_table(table, expected, keys)
+
+    assert_same_table(table, expected, keys)
+    missing = next(key for key in keys if key not in expected)
+    with pytest.raises(KeyError):
+        del table[missing]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_compact_lookup_table_matches_dict(seed):
+    rng = random.Random(seed)
+    table = CompactHashTable()
+    expected = {}
+    keys = range(1, 200)
+
+    for _ in range(2000):
+        key = rng.choice(keys)
+        if key in expected and rng.random() < 0.5:
+            del table[key]
+            del expected[key]
+        else:
+            expected[key] = table[key] = rng.randrange(2 ** 31)
+
+    assert_same_table(table, expected, keys)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("lazy", [True, False])
+@pytest.mark.parametrize("streamed", [False, True])
+def test_compact_hash_join_matches_nested_loop(seed, lazy, streamed):
+    rng = random.Random(seed)
+    table1 = random_table(rng, 1, 300, 500)
+    table2 = random_table(rng, 2, 200, 500)
+    # The rows are fetched back by id, like CheckTables.row_fetchers does from the databases
+    fetch = ({row[0]: row for row in table1}.__getitem__, {row[0]: row for row in table2}.__getitem__)
+    inputs = (iter(table1), iter(table2)) if streamed else (table1, table2)
+    join = HashJoin(*inputs, "table1", "table2", TIMESTAMP_DIFF, lazy, sink=ListSink(), compact=True, fetch=fetch)
+
+    assert join_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF, lazy)
+
+
+def window_tables(seed, size1, size2):
+    rng = random.Random(seed)
+    return arrival_order(rng, random_table(rng, 1, size1, 500)), arrival_order(rng, random_table(rng, 2, size2, 500))
+
+
+def fetchers(table1, table2):
+    return {row[0]: row for row in table1}.__getitem__, {row[0]: row for row in table2}.__getitem__
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("compact", [False, True])
+def test_window_hash_join_matches_nested_loop(seed, compact):
+    table1, table2 = window_tables(seed, 300, 200)
+    join = WindowHashJoin(table1, table2, "table1", "table2", TIMESTAMP_DIFF, ALLOWED_LATENESS, sink=ListSink(),
+                          compact=compact, fetch=fetchers(table1, table2) if compact else None)
+
+    assert join_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF)
+    assert join.late_tuples == 0
+    assert join.peak_entries < len(table1) + len(table2)
+    assert len(join.ht1) == len(join.ht2) == 0  # Both inputs are exhausted
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_window_hash_join_stops_inserting_once_an_input_is_exhausted(seed):
+    # table1 ends long before table2: the tuples of table2 read afterwards cannot match anything
+    table1, table2 = window_tables(seed, 100, 400)
+    join = WindowHashJoin(table1, table2, "table1", "table2", TIMESTAMP_DIFF, ALLOWED_LATENESS, sink=ListSink())
+
+    assert join_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF)
+    # The hash tables stay around the size of table1 instead of growing with the rest of table2
+    assert join.peak_entries < 2 * len(table1)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_concurrent_window_hash_join_matches_nested_loop(seed):
+    table1, table2 = window_tables(seed, 100, 400)
+    # Batches as a DualSourceReader yields them, an empty batch marking the end of a side
+    batches1 = [(1, table1[start:start + 10]) for start in range(0, len(table1), 10)] + [(1, [])]
+    batches2 = [(2, table2[start:start + 10]) for start in range(0, len(table2), 10)] + [(2, [])]
+    source = [batch for pair in zip(batches1, batches2) for batch in pair] + batches2[len(batches1):]
+    join = WindowHashJoin(None, None, "table1", "table2", TIMESTAMP_DIFF, ALLOWED_LATENESS, sink=ListSink())
+    join.perform_concurrent_hash_join(source)
+
+    assert sorted_results(join, table1) == nested_loop_join(table1, table2, TIMESTAMP_DIFF)
+    assert join.peak_entries < 2 * len(table1)
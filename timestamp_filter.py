@@ -0,0 +1,40 @@
+import bisect
+from columnar_table import epoch_column
+
+
+def has_neighbour(epochs, epoch, window):
+    """
+    Check whether a sorted list of epochs has a value strictly inside (epoch - window, epoch + window).
+
+    :param epochs: Sorted list of epoch seconds
+    :param epoch: Epoch seconds of the row being tested
+    :param window: Half-width of the window in seconds
+    :return: True if a neighbouring timestamp exists
+    """
+    # First position whose timestamp is greater than epoch - window
+    index = bisect.bisect_right(epochs, epoch - window)
+    return index < len(epochs) and epochs[index] < epoch + window
+
+
+def filter_tables(table1, table2, timestamp_diff):
+    """
+    Keep the rows of each table that have at least one row in the other table within timestamp_diff hours.
+
+    Each timestamp is parsed once, both timestamp columns are sorted and every row is checked with a binary
+    search against the sorted column of the other table, so the filter runs in O((n + m) log(n + m)).
+
+    :param table1: Rows of the first table
+    :param table2: Rows of the second table
+    :param timestamp_diff: Maximum timestamp difference in hours
+    :return: The filtered rows of both tables as sets of tuples
+    """
+    window = timestamp_diff * 3600
+    epochs1 = epoch_column(table1)
+    epochs2 = epoch_column(table2)
+    sorted1 = sorted(epochs1)
+    sorted2 = sorted(epochs2)
+
+    filtered_table1 = {tuple(row) for row, epoch in zip(table1, epochs1) if has_neighbour(sorted2, epoch, window)}
+    filtered_table2 = {tuple(row) for row, epoch in zip(table2, epochs2) if has_neighbour(sorted1, epoch, window)}
+
+    return filtered_table1, filtered_table2
@@ -0,0 +1,95 @@
+import heapq
+import math
+from pipelined_hash_join import HashJoin
+
+
+class WindowHashJoin(HashJoin):
+    def __init__(self, table1, table2, table1_name, table2_name, timestamp_diff, allowed_lateness=0, metrics=None,
+                 sink=None, compact=False, fetch=None):
+        """
+        Initialize the WindowHashJoin object.
+
+        A lazy pipelined hash join for inputs that arrive roughly in timestamp order. Every input keeps a watermark,
+        the newest timestamp it has produced. A tuple whose timestamp is older than the watermark of the other input
+        minus timestamp_diff and the allowed lateness can no longer match anything, so it is evicted from its hash
+        table, which keeps the hash tables at the size of the window instead of the size of the tables.
+
+        Once an input is exhausted, its watermark is infinite: no tuple of it will probe the hash table of the other
+        input anymore, so that table is cleared and the tuples of the other input are only probed from then on.
+
+        Tuples that arrive later than the allowed lateness (older than their own watermark minus the lateness) are
+        still probed and inserted, but partners of theirs may have been evicted already, so their matches may be
+        incomplete; they are counted in late_tuples.
+
+        :param allowed_lateness: How far (in hours) a tuple may be behind the newest timestamp of its input
+        """
+        super().__init__(table1, table2, table1_name, table2_name, timestamp_diff, True, metrics, sink, compact,
+                         fetch)
+        self.lateness = allowed_lateness * 3600  # Allowed lateness in seconds
+        self.watermarks = {1: None, 2: None}  # Newest timestamp seen per input
+        self.expiry = {1: [], 2: []}  # Heaps of (timestamp, key) per hash table
+        self.expired_entries = 0  # Tuples evicted from the hash tables
+        self.late_tuples = 0  # Tuples that arrived too late, whose matches may be incomplete
+
+    def evict(self, side, watermark):
+        """
+        Evict the tuples of a hash table that cannot match any future tuple of the other input.
+
+        :param side: 1 or 2, the hash table to evict from
+        :param watermark: The watermark of the other input
+        """
+        ht = self.ht1 if side == 1 else self.ht2
+        expiry = self.expiry[side]
+        limit = watermark - self.lateness - self.window
+        while expiry and expiry[0][0] <= limit:
+            epoch, key = heapq.heappop(expiry)
+            if self.compact:
+                if ht.get_epoch(key) != epoch:
+                    continue
+            else:
+                entry = ht.get(key)
+                if entry is None or entry[1] != epoch:
+                    continue
+                # The size of an entry is sampled on the first evicted tuples only, measuring all would be costly
+                if self.evicted_entries < 1000:
+                    self.evicted_entries += 1
+                    self.evicted_bytes += self.entry_sizeof(side)(key, entry)
+            del ht[key]
+            self.expired_entries += 1
+
+    def input_exhausted(self, side):
+        """
+        Set the watermark of an exhausted input to infinity and evict the whole hash table of the other input.
+        """
+        self.watermarks[side] = math.inf
+        self.evict(2 if side == 1 else 1, math.inf)
+
+    def probe_and_insert(self, tuple_, epoch, ht_probe, ht_insert):
+        """
+        Perform probing and insertion, then advance the watermark and evict expired tuples of the other input.
+
+        A late tuple is probed and inserted like the others: the tuples it finds are valid matches, and the
+        watermark of the other input evicts it again later.
+
+        :return: Result set if a match is found, None otherwise
+        """
+        side = 1 if ht_insert is self.ht1 else 2
+        other = 2 if side == 1 else 1
+        watermark = self.watermarks[side]
+
+        if watermark is not None and epoch < watermark - self.lateness:
+            self.late_tuples += 1
+
+        if self.watermarks[other] == math.inf:
+            # The other input is exhausted, nothing would probe the tuple
+            ht_insert = None
+
+        result_set = super().probe_and_insert(tuple_, epoch, ht_probe, ht_insert)
+        if ht_insert is not None:
+            heapq.heappush(self.expiry[side], (epoch, tuple_[0]))
+
+        if watermark is None or epoch > watermark:
+            self.watermarks[side] = epoch
+            self.evict(other, epoch)
+
+        return result_set